@@ -3,58 +3,1316 @@
 Script Writer Database Manager
 
 Manages user scriptwriting preferences and past scripts.
+
+Storage backends (set SCRIPT_WRITER_BACKEND to choose):
+    sqlite  ~/.claude/script_writer.db with indexed tables for preferences,
+            scripts and templates (default). An existing
+            ~/.claude/script_writer.json is migrated into it on first use.
+    json    ~/.claude/script_writer.json, rewritten in full (atomically, under
+            a file lock) on every change
+    log     ~/.claude/script_writer.snapshot.json plus an append-only
+            ~/.claude/script_writer.log of changes, folded into the snapshot
+            once it grows large (also migrates script_writer.json)
 """
 
+import heapq
 import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from contextlib import closing, contextmanager, suppress
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, but are not locked
+    fcntl = None
+
 DB_FILE = Path.home() / ".claude" / "script_writer.json"
+SQLITE_FILE = Path.home() / ".claude" / "script_writer.db"
+LOG_SNAPSHOT_FILE = Path.home() / ".claude" / "script_writer.snapshot.json"
+LOG_FILE = Path.home() / ".claude" / "script_writer.log"
+LOG_COMPACT_BYTES = 1024 * 1024
+BACKEND = os.environ.get("SCRIPT_WRITER_BACKEND", "sqlite")
 
 
-def ensure_db_file() -> None:
-    """Ensure the database file exists."""
-    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not DB_FILE.exists():
-        default_data = {
-            "initialized": False,
-            "created_at": datetime.now().isoformat(),
-            "preferences": {
-                "script_types": [],
-                "tone": "",
-                "target_audience": "",
-                "style": "",
-                "video_length": "",
-                "channel_niche": "",
-                "hook_style": "",
-                "call_to_action_preference": "",
-                "personality": "",
-                "use_humor": False,
-                "include_statistics": False,
-                "storytelling_approach": ""
-            },
-            "scripts": [],
-            "templates": []
+def default_data() -> Dict[str, Any]:
+    """The document a new database starts with."""
+    return {
+        "version": 0,
+        "initialized": False,
+        "created_at": datetime.now().isoformat(),
+        "preferences": {
+            "script_types": [],
+            "tone": "",
+            "target_audience": "",
+            "style": "",
+            "video_length": "",
+            "channel_niche": "",
+            "hook_style": "",
+            "call_to_action_preference": "",
+            "personality": "",
+            "use_humor": False,
+            "include_statistics": False,
+            "storytelling_approach": ""
+        },
+        "scripts": [],
+        "templates": []
+    }
+
+
+def new_id() -> str:
+    """Id for a new script or template."""
+    return str(datetime.now().timestamp())
+
+
+def read_legacy_json(path: Optional[Path]) -> Optional[Dict[str, Any]]:
+    """The document in a JSON database to migrate from, or None if there is none."""
+    if path is None or not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return None
+    return {**default_data(), **data} if isinstance(data, dict) else None
+
+
+def retire_legacy_json(path: Path) -> None:
+    """Keep a migrated JSON database as a backup that is never read again."""
+    path.rename(path.with_name(path.name + ".migrated"))
+
+
+# ============================================================================
+# SEARCH INDEX
+# ============================================================================
+
+# Field weights for ranking: a match in the title counts three times a match
+# in the body. Both backends use BM25 with these weights.
+SEARCH_WEIGHTS = {"title": 3, "tags": 2, "body": 1}
+BODY_FIELDS = ("content", "notes", "description", "structure")
+TOKEN_RE = re.compile(r"[^\W_]+")  # what SQLite's unicode61 tokenizer calls a token
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_LENGTH = 160
+SNIPPET_CONTEXT = 60
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def search_fields(item: Dict[str, Any]) -> Dict[str, str]:
+    """The searchable text of a script or template: title, tags and body."""
+    tags = item.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+    return {
+        "title": str(item.get("title") or item.get("name") or ""),
+        "tags": " ".join(str(tag) for tag in tags),
+        "body": "\n".join(str(item[field]) for field in BODY_FIELDS if item.get(field)),
+    }
+
+
+def search_result(kind: str, item: Dict[str, Any], score: float, terms: List[str]) -> Dict[str, Any]:
+    """One search hit: what it is, its rank score and the body text around the first match."""
+    fields = search_fields(item)
+    body = " ".join(fields["body"].split())
+    match = re.search(r"\b(" + "|".join(map(re.escape, terms)) + r")\b", body, re.IGNORECASE)
+    start = 0
+    if match and match.start() > SNIPPET_CONTEXT:
+        start = body.find(" ", match.start() - SNIPPET_CONTEXT) + 1
+    snippet = body[start:start + SNIPPET_LENGTH]
+    return {
+        "kind": kind,
+        "id": item.get("id"),
+        "title": fields["title"],
+        "type": item.get("type"),
+        "tone": item.get("tone"),
+        "score": float(f"{score:.4g}"),
+        "snippet": ("..." if start else "") + snippet + ("..." if start + SNIPPET_LENGTH < len(body) else ""),
+    }
+
+
+def _weighted_length(fields: Dict[str, str]) -> int:
+    """Document length for BM25 normalization: characters, weighted like term frequencies."""
+    return sum(len(text) * SEARCH_WEIGHTS[field] for field, text in fields.items())
+
+
+def _idf(n: int, df: int) -> float:
+    return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+def _bm25(tfs: List[float], idfs: List[float], length: float, average: float) -> float:
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+    return sum(idf * tf * (BM25_K1 + 1) / (tf + norm) for tf, idf in zip(tfs, idfs))
+
+
+def _filtered(item: Dict[str, Any], type: Optional[str], tone: Optional[str]) -> bool:
+    return (type is not None and item.get("type") != type) or (tone is not None and item.get("tone") != tone)
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over scripts and templates, ranked by BM25.
+
+    Postings map each term to the documents containing it with their
+    weighted term frequency (see SEARCH_WEIGHTS). Documents are the item
+    objects of the cached database document, tracked by identity rather
+    than id (old files can hold duplicate ids), and are added, replaced and
+    removed one at a time, so the index follows changes without being
+    rebuilt. A query matches items containing every one of its terms.
+    """
+
+    def __init__(self):
+        # term -> {document number: weighted term frequency}
+        self.postings = defaultdict(dict)
+        # id(item) -> document number, and document number -> (kind, item, terms, length)
+        self.numbers = {}
+        self.documents = {}
+        self.next_number = 0
+        self.total_length = 0
+
+    @classmethod
+    def build(cls, data: Dict[str, Any]) -> "SearchIndex":
+        index = cls()
+        for item in data.get("scripts", []):
+            index.add("script", item)
+        for item in data.get("templates", []):
+            index.add("template", item)
+        return index
+
+    def add(self, kind: str, item: Dict[str, Any]) -> None:
+        """Index an item, replacing what was indexed for the same item object before."""
+        self.remove(item)
+        fields = search_fields(item)
+        tokens = []
+        for field, text in fields.items():
+            # Repeating a field's tokens weights its term frequencies
+            tokens += tokenize(text) * SEARCH_WEIGHTS[field]
+        weighted = Counter(tokens)
+        number = self.next_number
+        self.next_number += 1
+        postings = self.postings
+        for term, tf in weighted.items():
+            postings[term][number] = tf
+        length = _weighted_length(fields)
+        self.numbers[id(item)] = number
+        self.documents[number] = (kind, item, tuple(weighted), length)
+        self.total_length += length
+
+    def remove(self, item: Dict[str, Any]) -> None:
+        number = self.numbers.pop(id(item), None)
+        if number is None:
+            return
+        _, _, terms, length = self.documents.pop(number)
+        for term in terms:
+            postings = self.postings[term]
+            del postings[number]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= length
+
+    def search(self, query: str, type: Optional[str] = None, tone: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.documents:
+            return []
+        postings = [self.postings.get(term, {}) for term in terms]
+        if not all(postings):
+            return []
+        n = len(self.documents)
+        average = self.total_length / n or 1
+        idfs = [_idf(n, len(p)) for p in postings]
+
+        scored = []
+        # Walk the rarest term's postings; the other terms must all be present
+        rarest = min(range(len(terms)), key=lambda i: len(postings[i]))
+        for number in postings[rarest]:
+            _, item, _, length = self.documents[number]
+            if _filtered(item, type, tone):
+                continue
+            tfs = [p.get(number) for p in postings]
+            if None not in tfs:
+                scored.append((_bm25(tfs, idfs, length, average), number))
+
+        results = []
+        for score, number in heapq.nlargest(limit, scored):
+            kind, item, _, _ = self.documents[number]
+            results.append(search_result(kind, item, score, terms))
+        return results
+
+
+def scan_search(data: Dict[str, Any], query: str, type: Optional[str] = None, tone: Optional[str] = None,
+                limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    SearchIndex.search() in one pass over a document, without building an index.
+
+    Terms are found with substring checks confirmed by a token-boundary
+    regex, and only full matches are counted, so a one-off query costs far
+    less than indexing every word. Scores are the same as the index's.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    # A term as a whole token: not preceded or followed by a token character
+    patterns = [re.compile(r"(?<![^\W_])" + re.escape(term) + r"(?![^\W_])") for term in terms]
+
+    n = 0
+    total_length = 0
+    dfs = [0] * len(terms)
+    matches = []
+    for kind, items in (("script", data.get("scripts", [])), ("template", data.get("templates", []))):
+        for item in items:
+            fields = search_fields(item)
+            length = _weighted_length(fields)
+            n += 1
+            total_length += length
+            text = "\n".join(fields.values()).lower()
+            present = [term in text and pattern.search(text) is not None for term, pattern in zip(terms, patterns)]
+            for i, found in enumerate(present):
+                dfs[i] += found
+            if all(present) and not _filtered(item, type, tone):
+                matches.append((kind, item, fields, length))
+    if not matches:
+        return []
+
+    average = total_length / n or 1
+    idfs = [_idf(n, df) for df in dfs]
+    scored = []
+    for number, (kind, item, fields, length) in enumerate(matches):
+        lowered = {field: text.lower() for field, text in fields.items()}
+        tfs = [sum(len(pattern.findall(text)) * SEARCH_WEIGHTS[field] for field, text in lowered.items())
+               for pattern in patterns]
+        scored.append((_bm25(tfs, idfs, length, average), number))
+    return [search_result(matches[number][0], matches[number][1], score, terms)
+            for score, number in heapq.nlargest(limit, scored)]
+
+
+# ============================================================================
+# DOCUMENT STORES
+# ============================================================================
+
+def _copy_tree(value: Any) -> Any:
+    """Independent copy of a JSON value (much cheaper than copy.deepcopy)."""
+    if isinstance(value, dict):
+        return {k: _copy_tree(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_tree(v) for v in value]
+    return value
+
+
+class ConflictError(RuntimeError):
+    """The database changed between load_data() and save_data()."""
+
+
+def apply_operation(data: Dict[str, Any], op: Dict[str, Any]) -> None:
+    """Apply one change, as recorded in the operation log, to a database document."""
+    kind = op["op"]
+    if kind == "save_preferences":
+        data["preferences"].update(op["preferences"])
+        data["initialized"] = True
+        data["last_updated"] = op["at"]
+    elif kind == "add_script":
+        data["scripts"].append(op["script"])
+    elif kind == "update_script":
+        for script in data["scripts"]:
+            if script.get("id") == op["id"]:
+                script.update(op["updates"])
+                script["updated_at"] = op["at"]
+                break
+    elif kind == "delete_script":
+        for i, script in enumerate(data["scripts"]):
+            if script.get("id") == op["id"]:
+                data["scripts"].pop(i)
+                break
+    elif kind == "add_template":
+        data["templates"].append(op["template"])
+    else:
+        raise ValueError(f"Unknown operation: {kind}")
+
+
+class DocumentStore(ABC):
+    """
+    Store operations on the whole database document.
+
+    The parsed document is cached in the store and only read again when
+    _fresh() says the stored copy has changed, so back-to-back calls parse
+    it once. Readers get copies of what they ask for; changes are made to
+    the cached document under locked() by apply_operation() and written
+    with _commit(), which inside transaction() is deferred to a single
+    write at the end.
+
+    Subclasses provide ensure(), _fresh(), _read() and _write().
+    """
+
+    def __init__(self):
+        self._mutex = threading.RLock()
+        self._cache = None
+        self._batch = 0
+        self._dirty = False
+        # SearchIndex over the cached document. The first search scans instead,
+        # so a one-off query (a CLI run) doesn't pay for indexing everything.
+        self._index = None
+        self._searched = False
+
+    @contextmanager
+    def locked(self):
+        """Exclude other writers for a read-modify-write cycle."""
+        with self._mutex:
+            yield
+
+    @abstractmethod
+    def ensure(self) -> None:
+        """Create the stored document if there is none yet."""
+
+    @abstractmethod
+    def _fresh(self) -> bool:
+        """Whether the cached document is still the stored one."""
+
+    @abstractmethod
+    def _read(self) -> Dict[str, Any]:
+        """The stored document."""
+
+    @abstractmethod
+    def _write(self, data: Dict[str, Any]) -> None:
+        """Replace the stored document."""
+
+    def _document(self) -> Dict[str, Any]:
+        # Shared with every caller: hold _mutex, and copy anything handed out
+        if self._cache is None or not (self._dirty or self._fresh()):
+            self.ensure()
+            self._index = None
+            self._cache = self._read()
+        return self._cache
+
+    def _discard(self) -> None:
+        """Forget unwritten changes; the document is read again on next use."""
+        self._cache = None
+        self._index = None
+        self._dirty = False
+
+    def _apply(self, data: Dict[str, Any], op: Dict[str, Any]) -> None:
+        """apply_operation(), keeping the search index (if built) in step."""
+        index = self._index
+        kind = op["op"]
+        if index is not None and kind == "delete_script":
+            for script in data["scripts"]:
+                if script.get("id") == op["id"]:
+                    index.remove(script)
+                    break
+        apply_operation(data, op)
+        if index is None:
+            return
+        if kind == "add_script":
+            index.add("script", op["script"])
+        elif kind == "add_template":
+            index.add("template", op["template"])
+        elif kind == "update_script":
+            for script in data["scripts"]:
+                if script.get("id") == op["id"]:
+                    index.add("script", script)
+                    break
+
+    @contextmanager
+    def _modify(self):
+        """The cached document, locked for changing in place."""
+        with self.locked():
+            try:
+                yield self._document()
+            except BaseException:
+                if not self._batch:
+                    # Possibly half-changed
+                    self._discard()
+                raise
+
+    def _change(self, op: Dict[str, Any]) -> None:
+        """Apply one operation (see apply_operation()) and save the result."""
+        with self._modify() as data:
+            self._apply(data, op)
+            self._commit(data)
+
+    def _commit(self, data: Dict[str, Any]) -> None:
+        self._cache = data
+        self._dirty = True
+        if not self._batch:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Write the changed cached document."""
+        data = self._cache
+        self._dirty = False
+        data["version"] = data.get("version", 0) + 1
+        try:
+            self._write(data)
+        except BaseException:
+            self._discard()
+            raise
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the lock across several changes and write them once at the end.
+
+        Nested transactions join the outermost one. An exception escaping
+        the outermost block discards every change made in it.
+        """
+        with self.locked():
+            self._batch += 1
+            try:
+                yield
+            except BaseException:
+                if self._batch == 1:
+                    self._discard()
+                raise
+            finally:
+                self._batch -= 1
+            if not self._batch and self._dirty:
+                self._flush()
+
+    def load(self) -> Dict[str, Any]:
+        with self._mutex:
+            return _copy_tree(self._document())
+
+    def save(self, data: Dict[str, Any]) -> None:
+        """
+        Replace the document with one from load().
+
+        The version counter it carries must still be the stored one, so a
+        load()/save() cycle that raced with another writer fails with
+        ConflictError instead of dropping that writer's changes.
+        """
+        with self.locked():
+            current = self._document().get("version", 0)
+            if data.get("version", 0) != current:
+                raise ConflictError(
+                    f"{self.path} changed since it was loaded "
+                    f"(version {data.get('version', 0)}, now {current}); reload and retry"
+                )
+            document = _copy_tree(data)
+            self._index = None
+            self._commit(document)
+            data["version"] = document["version"]
+
+    def is_initialized(self) -> bool:
+        with self._mutex:
+            return self._document().get("initialized", False)
+
+    def get_preferences(self) -> Dict[str, Any]:
+        with self._mutex:
+            return _copy_tree(self._document().get("preferences", {}))
+
+    def save_preferences(self, preferences: Dict[str, Any]) -> None:
+        self._change({"op": "save_preferences", "preferences": _copy_tree(preferences),
+                      "at": datetime.now().isoformat()})
+
+    def add_script(self, script: Dict[str, Any]) -> str:
+        script_id = new_id()
+        script["id"] = script_id
+        script["created_at"] = datetime.now().isoformat()
+        self._change({"op": "add_script", "script": _copy_tree(script)})
+        return script_id
+
+    def get_scripts(self) -> List[Dict[str, Any]]:
+        with self._mutex:
+            return _copy_tree(self._document().get("scripts", []))
+
+    def get_script_by_id(self, script_id: str) -> Optional[Dict[str, Any]]:
+        with self._mutex:
+            for script in self._document().get("scripts", []):
+                if script.get("id") == script_id:
+                    return _copy_tree(script)
+        return None
+
+    def _has_script(self, script_id: str) -> bool:
+        return any(script.get("id") == script_id for script in self._document().get("scripts", []))
+
+    def update_script(self, script_id: str, updates: Dict[str, Any]) -> bool:
+        with self.locked():
+            if not self._has_script(script_id):
+                return False
+            new_id = updates.get("id", script_id)
+            if new_id != script_id and self._has_script(new_id):
+                raise ValueError(f"Script id {new_id} is already taken")
+            self._change({"op": "update_script", "id": script_id, "updates": _copy_tree(updates),
+                          "at": datetime.now().isoformat()})
+            return True
+
+    def delete_script(self, script_id: str) -> bool:
+        with self.locked():
+            if not self._has_script(script_id):
+                return False
+            self._change({"op": "delete_script", "id": script_id})
+            return True
+
+    def add_template(self, template: Dict[str, Any]) -> str:
+        template_id = new_id()
+        template["id"] = template_id
+        template["created_at"] = datetime.now().isoformat()
+        self._change({"op": "add_template", "template": _copy_tree(template)})
+        return template_id
+
+    def get_templates(self) -> List[Dict[str, Any]]:
+        with self._mutex:
+            return _copy_tree(self._document().get("templates", []))
+
+    def search(self, query: str, type: Optional[str] = None, tone: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        with self._mutex:
+            data = self._document()
+            if self._index is None:
+                if not self._searched:
+                    self._searched = True
+                    return scan_search(data, query, type, tone, limit)
+                self._index = SearchIndex.build(data)
+            return self._index.search(query, type, tone, limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._mutex:
+            scripts = self._document().get("scripts", [])
+
+            script_types = {}
+            tones = {}
+
+            for script in scripts:
+                script_type = script.get("type", "Unknown")
+                tone = script.get("tone", "Unknown")
+
+                script_types[script_type] = script_types.get(script_type, 0) + 1
+                tones[tone] = tones.get(tone, 0) + 1
+
+        return {
+            "total_scripts": len(scripts),
+            "by_type": script_types,
+            "by_tone": tones
+        }
+
+
+class JsonStore(DocumentStore):
+    """
+    The whole database as one JSON file.
+
+    Writes go to a temporary file that is fsynced and renamed over the
+    database, so a crash leaves either the old or the new document, never a
+    truncated one. Read-modify-write cycles hold an advisory lock on a
+    sidecar .lock file, which also excludes other processes. The cached
+    document is reused while the file's inode, size and mtime are unchanged.
+    """
+
+    def __init__(self, path: Path = DB_FILE):
+        super().__init__()
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._depth = 0
+        self._lock_file = None
+        # Identity of the file the cached document was read from or written to
+        self._identity = None
+
+    @contextmanager
+    def locked(self):
+        """Hold the database lock (re-entrant; excludes other threads and processes)."""
+        with self._mutex:
+            if self._depth == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._lock_file = open(self.lock_path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    # Closing the file releases the lock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    @staticmethod
+    def _stat_identity(st: os.stat_result) -> tuple:
+        # Every write renames a new inode into place, so this changes with the document
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def ensure(self) -> None:
+        if self.path.exists():
+            return
+        with self.locked():
+            if not self.path.exists():
+                self._write(default_data())
+
+    def _fresh(self) -> bool:
+        try:
+            return self._stat_identity(os.stat(self.path)) == self._identity
+        except FileNotFoundError:
+            return False
+
+    def _read(self) -> Dict[str, Any]:
+        with open(self.path, 'r') as f:
+            identity = self._stat_identity(os.fstat(f.fileno()))
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Corrupt database file {self.path}: {e}") from e
+        self._identity = identity
+        return data
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+            raise
+        if os.name == "posix":
+            # Make the rename itself durable
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        self._identity = self._stat_identity(os.stat(self.path))
+
+
+class LogStore(JsonStore):
+    """
+    A JSON snapshot plus an append-only log of operations.
+
+    Every change appends one compact JSON line to the log (see
+    apply_operation()), so writing costs the size of the change rather than
+    the size of the library. Reading replays the log over the snapshot;
+    when the log has only grown since the last read, just the new lines are
+    applied. Once the log outgrows both LOG_COMPACT_BYTES and the snapshot
+    it is folded into a new snapshot, which keeps replay cost bounded and
+    the amortized write cost proportional to the change.
+
+    Each log line records the document version it produces, and replay
+    skips lines the snapshot already includes, so a crash between writing
+    a snapshot and emptying the log cannot apply an operation twice. A line
+    torn by a crash mid-append is ignored and cut off by the next writer.
+    """
+
+    def __init__(self, path: Path = LOG_SNAPSHOT_FILE, log_path: Path = LOG_FILE,
+                 migrate_from: Path = DB_FILE, compact_bytes: int = LOG_COMPACT_BYTES):
+        super().__init__(path)
+        self.log_path = Path(log_path)
+        self.migrate_from = Path(migrate_from) if migrate_from else None
+        self.compact_bytes = compact_bytes
+        self._pending = []
+        self._rewrite = False
+        # Inode of the log and how far into it the cached document goes
+        self._log_ino = None
+        self._offset = 0
+
+    def ensure(self) -> None:
+        if self.path.exists():
+            return
+        with self.locked():
+            if not self.path.exists():
+                legacy = read_legacy_json(self.migrate_from)
+                self._write(legacy if legacy is not None else default_data())
+                if legacy is not None:
+                    retire_legacy_json(self.migrate_from)
+
+    def _fresh(self) -> bool:
+        if not super()._fresh():
+            return False
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return self._log_ino is None
+        if st.st_ino != self._log_ino or st.st_size < self._offset:
+            return False
+        if st.st_size > self._offset:
+            # Only appended to since: apply the new lines
+            self._replay(self._cache)
+        return True
+
+    def _read(self) -> Dict[str, Any]:
+        # Under the lock, so a compaction cannot happen between the two reads
+        with self.locked():
+            data = super()._read()
+            self._log_ino, self._offset = None, 0
+            self._replay(data)
+        return data
+
+    def _replay(self, data: Dict[str, Any]) -> None:
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            ino = os.fstat(f.fileno()).st_ino
+            if ino != self._log_ino:
+                self._log_ino, self._offset = ino, 0
+            f.seek(self._offset)
+            chunk = f.read()
+        # Leave a torn last line (no newline yet) for later
+        end = chunk.rfind(b"\n") + 1
+        for n, line in enumerate(chunk[:end].splitlines()):
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Corrupt operation log {self.log_path} (entry {n + 1} after byte {self._offset}): {e}") from e
+            if op["v"] > data.get("version", 0):
+                self._apply(data, op)
+                data["version"] = op["v"]
+        self._offset += end
+
+    def _discard(self) -> None:
+        super()._discard()
+        self._pending = []
+        self._rewrite = False
+
+    def _change(self, op: Dict[str, Any]) -> None:
+        with self._modify() as data:
+            self._apply(data, op)
+            data["version"] = data.get("version", 0) + 1
+            self._pending.append({**op, "v": data["version"]})
+            self._dirty = True
+            if not self._batch:
+                self._flush()
+
+    def _commit(self, data: Dict[str, Any]) -> None:
+        # A whole-document save() goes straight to a new snapshot
+        self._rewrite = True
+        super()._commit(data)
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        rewrite, self._rewrite = self._rewrite, False
+        if rewrite:
+            super()._flush()
+            self._truncate_log()
+            return
+        self._dirty = False
+        try:
+            self._append(pending)
+        except BaseException:
+            self._discard()
+            raise
+        if self._offset > max(self.compact_bytes, self._identity[1]):
+            self.compact()
+
+    def _append(self, ops: List[Dict[str, Any]]) -> None:
+        payload = "".join(json.dumps(op, separators=(",", ":")) + "\n" for op in ops).encode("utf-8")
+        with open(self.log_path, 'ab') as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._log_ino:
+                self._log_ino, self._offset = st.st_ino, 0
+            if st.st_size > self._offset:
+                f.truncate(self._offset)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._offset += len(payload)
+
+    def _truncate_log(self) -> None:
+        with open(self.log_path, 'wb') as f:
+            self._log_ino = os.fstat(f.fileno()).st_ino
+        self._offset = 0
+
+    def compact(self) -> Dict[str, int]:
+        """Fold the operation log into a new snapshot."""
+        with self.locked():
+            if self._dirty:
+                raise RuntimeError("compact() cannot run inside a transaction with unwritten changes")
+            data = self._document()
+            log_bytes = self._offset
+            # The snapshot takes the version of the last operation, so replaying
+            # the old log over it (if emptying the log fails) skips every line
+            self._write(data)
+            self._truncate_log()
+            return {"log_bytes": log_bytes, "snapshot_bytes": self._identity[1]}
+
+
+# ============================================================================
+# SQLITE STORE
+# ============================================================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scripts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT,
+    tone TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scripts_type ON scripts (type);
+CREATE INDEX IF NOT EXISTS idx_scripts_tone ON scripts (tone);
+CREATE INDEX IF NOT EXISTS idx_scripts_created_at ON scripts (created_at);
+CREATE TABLE IF NOT EXISTS templates (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_templates_type ON templates (type);
+CREATE INDEX IF NOT EXISTS idx_templates_created_at ON templates (created_at);
+"""
+SCHEMA_OBJECTS = set(re.findall(r"IF NOT EXISTS (\w+)", SCHEMA))
+
+# Full-text index over scripts (rowid = scripts.seq) and templates
+# (rowid = -templates.seq), so both are ranked together and each row's
+# entry can be replaced by rowid
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE search_fts USING fts5 (
+    title, tags, body,
+    tokenize = 'unicode61 remove_diacritics 0'
+)
+"""
+
+
+def fts5_available() -> bool:
+    """Whether this SQLite build has FTS5 (tried on a throwaway in-memory database)."""
+    with closing(sqlite3.connect(":memory:")) as conn:
+        try:
+            conn.execute("CREATE VIRTUAL TABLE probe USING fts5 (x)")
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def _retry_busy(fn, timeout: float = 30):
+    """
+    Call fn(), retrying while SQLite reports the database locked.
+
+    Switching the journal mode and schema changes need an exclusive lock,
+    and SQLite can fail them at once instead of waiting out the busy timeout.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _column(value: Any) -> Any:
+    """A document value as an indexable column value (non-scalars are stored as JSON)."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value)
+
+
+class SqliteStore:
+    """
+    Indexed SQLite database.
+
+    Top-level document fields (initialized, created_at, ...) live in `meta`
+    and each preference in `preferences`, both as JSON values. Scripts and
+    templates are one row each, with the full object as JSON in `data` and
+    the fields used for lookups (id, type, tone, created_at) as indexed
+    columns, so single-script operations touch one row instead of the whole
+    library.
+
+    The database is set up (WAL mode, schema, JSON migration) by the first
+    process to find it missing or incomplete, under the JSON database's lock
+    file; later processes only check it with reads.
+    """
+
+    def __init__(self, path: Path = SQLITE_FILE, migrate_from: Path = DB_FILE):
+        self.path = Path(path)
+        self.migrate_from = Path(migrate_from) if migrate_from else None
+        # Shared with JsonStore, so JSON writers wait while their file is migrated
+        lock_target = self.migrate_from or self.path
+        self.lock_path = lock_target.with_name(lock_target.name + ".lock")
+        self._ready = False
+        # Whether this SQLite build has FTS5 (see ensure())
+        self._fts = True
+        # This thread's connection while a transaction() is open
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several changes as one SQLite transaction.
+
+        Nested transactions join the outermost one. An exception escaping
+        the outermost block rolls back every change made in it.
+        """
+        with self._transaction():
+            yield
+
+    @contextmanager
+    def _transaction(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        self.ensure()
+        with closing(self._connect()) as conn:
+            self._local.conn = conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                # Every write moves the version on, as the JSON store does
+                conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('version', '1') "
+                    "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.conn = None
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            # Inside transaction(): see its uncommitted changes
+            yield conn
+            return
+        self.ensure()
+        with closing(self._connect()) as conn:
+            yield conn
+
+    def ensure(self) -> None:
+        """Create the database on first use, migrating the JSON file if there is one."""
+        if self._ready and self.path.exists():
+            return
+        if not self._set_up():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another process may have finished setting up while we waited
+                if not self._set_up():
+                    self._set_up_locked()
+        self._ready = True
+
+    def _set_up(self) -> bool:
+        """Whether the database is fully set up, checked with reads only."""
+        if not self.path.exists():
+            return False
+        with closing(self._connect()) as conn:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                return False
+            names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+            if not SCHEMA_OBJECTS <= names:
+                return False
+            if "search_fts" not in names and fts5_available():
+                return False
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'created_at'").fetchone() is None:
+                return False
+        self._fts = "search_fts" in names
+        return True
+
+    def _set_up_locked(self) -> None:
+        # Holding lock_path: no other process is setting up
+        with closing(self._connect()) as conn:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                _retry_busy(lambda: conn.execute("PRAGMA journal_mode=WAL"))
+            _retry_busy(lambda: conn.executescript(SCHEMA))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._fts = self._ensure_search(conn)
+                if conn.execute("SELECT 1 FROM meta WHERE key = 'created_at'").fetchone() is None:
+                    self._initialize(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _ensure_search(self, conn: sqlite3.Connection) -> bool:
+        """Create the full-text index (filling it from a database that predates it)."""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'").fetchone():
+            return True
+        try:
+            conn.execute(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            # No FTS5 in this SQLite build; search() scans instead
+            return False
+        self._fts = True
+        for seq, data in conn.execute("SELECT seq, data FROM scripts").fetchall():
+            self._index_item(conn, seq, json.loads(data))
+        for seq, data in conn.execute("SELECT seq, data FROM templates").fetchall():
+            self._index_item(conn, -seq, json.loads(data))
+        return True
+
+    def _index_item(self, conn: sqlite3.Connection, rowid: int, item: Optional[Dict[str, Any]]) -> None:
+        """Replace (or with item=None, remove) a row's full-text entry."""
+        if not self._fts:
+            return
+        conn.execute("DELETE FROM search_fts WHERE rowid = ?", (rowid,))
+        if item is not None:
+            fields = search_fields(item)
+            conn.execute(
+                "INSERT INTO search_fts (rowid, title, tags, body) VALUES (?, ?, ?, ?)",
+                (rowid, fields["title"], fields["tags"], fields["body"]),
+            )
+
+    def _initialize(self, conn: sqlite3.Connection) -> None:
+        legacy = read_legacy_json(self.migrate_from)
+        self._import(conn, legacy if legacy is not None else default_data())
+        if legacy is not None:
+            retire_legacy_json(self.migrate_from)
+
+    def _import(self, conn: sqlite3.Connection, data: Dict[str, Any]) -> None:
+        for table in ("meta", "preferences", "scripts", "templates"):
+            conn.execute(f"DELETE FROM {table}")
+        if self._fts:
+            conn.execute("DELETE FROM search_fts")
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in data.items() if k not in ("preferences", "scripts", "templates")],
+        )
+        conn.executemany(
+            "INSERT INTO preferences (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in data.get("preferences", {}).items()],
+        )
+        for table in ("scripts", "templates"):
+            seen = set()
+            for item in data.get(table, []):
+                # Ids are timestamps, so old files can contain duplicates
+                item_id = str(item.get("id") or new_id())
+                base, n = item_id, 1
+                while item_id in seen:
+                    n += 1
+                    item_id = f"{base}-{n}"
+                seen.add(item_id)
+                item = {**item, "id": item_id}
+                self._insert(conn, table, item)
+
+    def _insert(self, conn: sqlite3.Connection, table: str, item: Dict[str, Any]) -> None:
+        if table == "scripts":
+            seq = conn.execute(
+                "INSERT INTO scripts (id, type, tone, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (item["id"], _column(item.get("type", "Unknown")), _column(item.get("tone", "Unknown")),
+                 _column(item.get("created_at")), json.dumps(item)),
+            ).lastrowid
+            self._index_item(conn, seq, item)
+        else:
+            seq = conn.execute(
+                "INSERT INTO templates (id, type, created_at, data) VALUES (?, ?, ?, ?)",
+                (item["id"], _column(item.get("type")), _column(item.get("created_at")), json.dumps(item)),
+            ).lastrowid
+            self._index_item(conn, -seq, item)
+
+    def _add(self, table: str, item: Dict[str, Any]) -> str:
+        with self._transaction() as conn:
+            while True:
+                item["id"] = new_id()
+                item["created_at"] = datetime.now().isoformat()
+                try:
+                    self._insert(conn, table, item)
+                    return item["id"]
+                except sqlite3.IntegrityError:
+                    # Same-microsecond id from another writer; take a fresh one
+                    continue
+
+    def load(self) -> Dict[str, Any]:
+        """The whole database as the JSON backend's document."""
+        with self._reader() as conn:
+            data = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+            data["preferences"] = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM preferences")}
+            data["scripts"] = [json.loads(d) for (d,) in conn.execute("SELECT data FROM scripts ORDER BY seq")]
+            data["templates"] = [json.loads(d) for (d,) in conn.execute("SELECT data FROM templates ORDER BY seq")]
+        return data
+
+    def save(self, data: Dict[str, Any]) -> None:
+        """Replace the whole database with a document loaded from it (see JsonStore.save())."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            current = json.loads(row[0]) if row else 0
+            if data.get("version", 0) != current:
+                raise ConflictError(
+                    f"{self.path} changed since it was loaded "
+                    f"(version {data.get('version', 0)}, now {current}); reload and retry"
+                )
+            self._import(conn, {**data, "version": current})
+        data["version"] = current + 1
+
+    def is_initialized(self) -> bool:
+        with self._reader() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+        return json.loads(row[0]) if row else False
+
+    def get_preferences(self) -> Dict[str, Any]:
+        with self._reader() as conn:
+            return {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM preferences")}
+
+    def save_preferences(self, preferences: Dict[str, Any]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO preferences (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in preferences.items()],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("initialized", json.dumps(True)), ("last_updated", json.dumps(datetime.now().isoformat()))],
+            )
+
+    def add_script(self, script: Dict[str, Any]) -> str:
+        return self._add("scripts", script)
+
+    def get_scripts(self) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            return [json.loads(d) for (d,) in conn.execute("SELECT data FROM scripts ORDER BY seq")]
+
+    def get_script_by_id(self, script_id: str) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute("SELECT data FROM scripts WHERE id = ?", (script_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_script(self, script_id: str, updates: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT seq, data FROM scripts WHERE id = ?", (script_id,)).fetchone()
+            if row is None:
+                return False
+            seq, script = row[0], json.loads(row[1])
+            new_id = updates.get("id", script_id)
+            if new_id != script_id and conn.execute("SELECT 1 FROM scripts WHERE id = ?", (new_id,)).fetchone():
+                raise ValueError(f"Script id {new_id} is already taken")
+            script.update(updates)
+            script["updated_at"] = datetime.now().isoformat()
+            # The id column too, so a renamed script is found by its new id
+            conn.execute(
+                "UPDATE scripts SET id = ?, type = ?, tone = ?, created_at = ?, data = ? WHERE seq = ?",
+                (script["id"], _column(script.get("type", "Unknown")), _column(script.get("tone", "Unknown")),
+                 _column(script.get("created_at")), json.dumps(script), seq),
+            )
+            self._index_item(conn, seq, script)
+            return True
+
+    def delete_script(self, script_id: str) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT seq FROM scripts WHERE id = ?", (script_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM scripts WHERE seq = ?", (row[0],))
+            self._index_item(conn, row[0], None)
+            return True
+
+    def add_template(self, template: Dict[str, Any]) -> str:
+        return self._add("templates", template)
+
+    def get_templates(self) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            return [json.loads(d) for (d,) in conn.execute("SELECT data FROM templates ORDER BY seq")]
+
+    def search(self, query: str, type: Optional[str] = None, tone: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.ensure()
+        if not self._fts:
+            return scan_search(self.load(), query, type, tone, limit)
+        # Tokens are letters and digits only, so quoting makes each a plain term
+        match = " ".join(f'"{term}"' for term in terms)
+        weights = ", ".join(str(SEARCH_WEIGHTS[field]) for field in ("title", "tags", "body"))
+        with self._reader() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT f.rowid, COALESCE(s.data, t.data), bm25(search_fts, {weights}) AS rank
+                FROM search_fts AS f
+                LEFT JOIN scripts AS s ON f.rowid > 0 AND s.seq = f.rowid
+                LEFT JOIN templates AS t ON f.rowid < 0 AND t.seq = -f.rowid
+                WHERE search_fts MATCH ?
+                  AND (? IS NULL OR json_extract(COALESCE(s.data, t.data), '$.type') = ?)
+                  AND (? IS NULL OR json_extract(COALESCE(s.data, t.data), '$.tone') = ?)
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, type, type, tone, tone, limit),
+            ).fetchall()
+        # bm25() is lower-is-better; flip it to match SearchIndex scores
+        return [search_result("script" if rowid > 0 else "template", json.loads(data), -rank, terms)
+                for rowid, data, rank in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._reader() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
+            # Ordered by first appearance, like the document scan
+            by_type = dict(conn.execute("SELECT type, COUNT(*) FROM scripts GROUP BY type ORDER BY MIN(seq)"))
+            by_tone = dict(conn.execute("SELECT tone, COUNT(*) FROM scripts GROUP BY tone ORDER BY MIN(seq)"))
+        return {
+            "total_scripts": total,
+            "by_type": by_type,
+            "by_tone": by_tone
         }
-        DB_FILE.write_text(json.dumps(default_data, indent=2))
+
+
+BACKENDS = {
+    "json": lambda: JsonStore(DB_FILE),
+    "sqlite": lambda: SqliteStore(SQLITE_FILE, migrate_from=DB_FILE),
+    "log": lambda: LogStore(LOG_SNAPSHOT_FILE, LOG_FILE, migrate_from=DB_FILE),
+}
+
+_stores = {}
+
+
+def get_store():
+    """The store for the configured BACKEND (one instance per backend and path)."""
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown SCRIPT_WRITER_BACKEND: {BACKEND} (expected one of {', '.join(BACKENDS)})")
+    key = (BACKEND, DB_FILE, SQLITE_FILE, LOG_SNAPSHOT_FILE, LOG_FILE)
+    if key not in _stores:
+        _stores[key] = BACKENDS[BACKEND]()
+    return _stores[key]
+
+
+def ensure_db_file() -> None:
+    """Ensure the database exists."""
+    get_store().ensure()
 
 
 def load_data() -> Dict[str, Any]:
-    """Load data from file."""
-    ensure_db_file()
-    try:
-        with open(DB_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {}
+    """Load the whole database as one document."""
+    return get_store().load()
 
 
 def save_data(data: Dict[str, Any]) -> None:
-    """Save data to file."""
-    ensure_db_file()
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """
+    Replace the whole database with a document from load_data().
+
+    Raises ConflictError if the database was changed by anyone else since.
+    """
+    get_store().save(data)
+
+
+def transaction():
+    """
+    Group several changes into one locked update with a single write.
+
+    Usage:
+        with transaction():
+            save_preferences({"tone": "casual"})
+            script_id = add_script({...})
+            update_script(script_id, {"notes": "..."})
+    """
+    return get_store().transaction()
 
 
 # ============================================================================
@@ -63,23 +1321,17 @@ def save_data(data: Dict[str, Any]) -> None:
 
 def is_initialized() -> bool:
     """Check if preferences are initialized."""
-    data = load_data()
-    return data.get("initialized", False)
+    return get_store().is_initialized()
 
 
 def get_preferences() -> Dict[str, Any]:
     """Get user preferences."""
-    data = load_data()
-    return data.get("preferences", {})
+    return get_store().get_preferences()
 
 
 def save_preferences(preferences: Dict[str, Any]) -> None:
     """Save user preferences."""
-    data = load_data()
-    data["preferences"].update(preferences)
-    data["initialized"] = True
-    data["last_updated"] = datetime.now().isoformat()
-    save_data(data)
+    get_store().save_preferences(preferences)
 
 
 # ============================================================================
@@ -88,51 +1340,27 @@ def save_preferences(preferences: Dict[str, Any]) -> None:
 
 def add_script(script: Dict[str, Any]) -> str:
     """Add a new script."""
-    data = load_data()
-    script_id = str(datetime.now().timestamp())
-    script["id"] = script_id
-    script["created_at"] = datetime.now().isoformat()
-    data["scripts"].append(script)
-    save_data(data)
-    return script_id
+    return get_store().add_script(script)
 
 
 def get_scripts() -> List[Dict[str, Any]]:
     """Get all scripts."""
-    data = load_data()
-    return data.get("scripts", [])
+    return get_store().get_scripts()
 
 
 def get_script_by_id(script_id: str) -> Optional[Dict[str, Any]]:
     """Get a specific script."""
-    data = load_data()
-    for script in data.get("scripts", []):
-        if script.get("id") == script_id:
-            return script
-    return None
+    return get_store().get_script_by_id(script_id)
 
 
 def update_script(script_id: str, updates: Dict[str, Any]) -> bool:
     """Update a script."""
-    data = load_data()
-    for script in data["scripts"]:
-        if script.get("id") == script_id:
-            script.update(updates)
-            script["updated_at"] = datetime.now().isoformat()
-            save_data(data)
-            return True
-    return False
+    return get_store().update_script(script_id, updates)
 
 
 def delete_script(script_id: str) -> bool:
     """Delete a script."""
-    data = load_data()
-    for i, script in enumerate(data["scripts"]):
-        if script.get("id") == script_id:
-            data["scripts"].pop(i)
-            save_data(data)
-            return True
-    return False
+    return get_store().delete_script(script_id)
 
 
 # ============================================================================
@@ -141,19 +1369,12 @@ def delete_script(script_id: str) -> bool:
 
 def add_template(template: Dict[str, Any]) -> str:
     """Add a custom template."""
-    data = load_data()
-    template_id = str(datetime.now().timestamp())
-    template["id"] = template_id
-    template["created_at"] = datetime.now().isoformat()
-    data["templates"].append(template)
-    save_data(data)
-    return template_id
+    return get_store().add_template(template)
 
 
 def get_templates() -> List[Dict[str, Any]]:
     """Get all templates."""
-    data = load_data()
-    return data.get("templates", [])
+    return get_store().get_templates()
 
 
 # ============================================================================
@@ -162,26 +1383,55 @@ def get_templates() -> List[Dict[str, Any]]:
 
 def get_stats() -> Dict[str, Any]:
     """Get script statistics."""
-    data = load_data()
-    scripts = data.get("scripts", [])
+    return get_store().get_stats()
+
+
+# ============================================================================
+# SEARCH
+# ============================================================================
 
-    script_types = {}
-    tones = {}
+def search(query: str, type: Optional[str] = None, tone: Optional[str] = None,
+           limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Ranked full-text search over script and template titles, tags and bodies.
 
-    for script in scripts:
-        script_type = script.get("type", "Unknown")
-        tone = script.get("tone", "Unknown")
+    Every word of the query must match. Results are best first, each with
+    kind ("script" or "template"), id, title, type, tone, score and a
+    snippet of the body; use get_script_by_id() for the full script.
+    """
+    return get_store().search(query, type, tone, limit)
 
-        script_types[script_type] = script_types.get(script_type, 0) + 1
-        tones[tone] = tones.get(tone, 0) + 1
 
+# ============================================================================
+# MIGRATION AND COMPACTION
+# ============================================================================
+
+def migrate(source: Path = DB_FILE, target: Path = SQLITE_FILE) -> Dict[str, Any]:
+    """
+    Migrate a JSON database into SQLite.
+
+    Happens automatically the first time the sqlite backend is used; this
+    runs it explicitly and reports what the SQLite database now holds.
+    """
+    store = SqliteStore(target, migrate_from=source)
+    store.ensure()
+    data = store.load()
     return {
-        "total_scripts": len(scripts),
-        "by_type": script_types,
-        "by_tone": tones
+        "database": str(target),
+        "scripts": len(data["scripts"]),
+        "templates": len(data["templates"]),
+        "preferences": len(data["preferences"]),
     }
 
 
+def compact() -> Dict[str, Any]:
+    """Fold the log backend's operation log into a new snapshot now."""
+    store = get_store()
+    if not isinstance(store, LogStore):
+        raise ValueError(f"compact applies to the log backend only (SCRIPT_WRITER_BACKEND={BACKEND})")
+    return store.compact()
+
+
 # ============================================================================
 # CLI
 # ============================================================================
@@ -196,6 +1446,9 @@ if __name__ == "__main__":
         print("  python3 script_db.py get_preferences")
         print("  python3 script_db.py get_scripts")
         print("  python3 script_db.py stats")
+        print('  python3 script_db.py search "query" [--type TYPE] [--tone TONE] [--limit N]')
+        print("  python3 script_db.py migrate")
+        print("  python3 script_db.py compact")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -208,6 +1461,19 @@ if __name__ == "__main__":
         print(json.dumps(get_scripts(), indent=2))
     elif command == "stats":
         print(json.dumps(get_stats(), indent=2))
+    elif command == "search":
+        import argparse
+        parser = argparse.ArgumentParser(prog="script_db.py search", description="Search stored scripts and templates")
+        parser.add_argument("query", help="Words to search for (all must match)")
+        parser.add_argument("--type", help="Only items of this type")
+        parser.add_argument("--tone", help="Only items with this tone")
+        parser.add_argument("--limit", type=int, default=20, help="Maximum results (default: 20)")
+        args = parser.parse_args(sys.argv[2:])
+        print(json.dumps(search(args.query, args.type, args.tone, args.limit), indent=2))
+    elif command == "migrate":
+        print(json.dumps(migrate(), indent=2))
+    elif command == "compact":
+        print(json.dumps(compact(), indent=2))
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)
@@ -0,0 +1,73 @@
+"""
+Multi-process tests for first use of the SQLite store (script_db.SqliteStore).
+
+Run with: python -m pytest tests/
+"""
+
+import json
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import script_db
+
+pytestmark = pytest.mark.skipif(script_db.fcntl is None, reason="needs fcntl file locks")
+
+WORKER = """
+import sys, time
+from pathlib import Path
+sys.path.insert(0, {scripts!r})
+import script_db
+
+directory, start = Path(sys.argv[1]), float(sys.argv[2])
+store = script_db.SqliteStore(directory / "db.sqlite", migrate_from=directory / "db.json")
+while time.time() < start:
+    pass
+for i in range(5):
+    store.add_script({{"title": f"script {{i}}"}})
+print(len(store.get_scripts()))
+"""
+
+
+@pytest.mark.parametrize("legacy", [False, True], ids=["new", "migrated"])
+def test_concurrent_first_use(tmp_path, legacy):
+    if legacy:
+        (tmp_path / "db.json").write_text(json.dumps({"scripts": [{"id": "1", "title": "legacy"}]}))
+    # Every process starts at once on a database that doesn't exist yet
+    start = time.time() + 1.0
+    code = WORKER.format(scripts=str(SCRIPTS_DIR))
+    procs = [subprocess.Popen([sys.executable, "-c", code, str(tmp_path), str(start)],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+             for _ in range(8)]
+    for proc in procs:
+        out, err = proc.communicate(timeout=120)
+        assert proc.returncode == 0, err
+
+    store = script_db.SqliteStore(tmp_path / "db.sqlite", migrate_from=tmp_path / "db.json")
+    titles = [s["title"] for s in store.get_scripts()]
+    assert len(titles) == 40 + legacy
+    assert titles.count("legacy") == legacy
+    assert (tmp_path / "db.json.migrated").exists() == legacy
+
+
+def test_reads_do_not_wait_for_writers(tmp_path):
+    store = script_db.SqliteStore(tmp_path / "db.sqlite", migrate_from=None)
+    store.add_script({"title": "first"})
+    writer = sqlite3.connect(tmp_path / "db.sqlite", isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        # A new store (as in a new process) checks the set-up database with reads only
+        started = time.monotonic()
+        other = script_db.SqliteStore(tmp_path / "db.sqlite", migrate_from=None)
+        assert [s["title"] for s in other.get_scripts()] == ["first"]
+        assert time.monotonic() - started < 5
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Indexed manifest of the Kaggle chest X-ray dataset.
+
+Scans chest_xray/{train,test,val}/{NORMAL,PNEUMONIA}/ once and caches a
+compact columnar index (path, label, split, size, content hash, dimensions).
+Later runs only stat the indexed files of class directories that are
+unchanged, without listing them, and hash again only new or modified files.
+Unreadable images are reported and left out of the index.
+
+Usage:
+    python benchmark/manifest.py /path/to/chest_xray            # build/refresh and summarize
+    python benchmark/manifest.py /path/to/chest_xray --rescan   # ignore the cached index
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "cxr-pneumonia-benchmark" / "manifests"
+MANIFEST_VERSION = 1
+
+SPLITS = ["train", "test", "val"]
+CATEGORIES = {"NORMAL": "NO", "PNEUMONIA": "YES"}
+IMAGE_SUFFIXES = {".jpeg", ".jpg", ".png"}
+
+COLUMNS = ["path", "label", "split", "size", "mtime_ns", "sha256", "width", "height"]
+
+
+def dataset_root(data_dir: str) -> Path:
+    """Resolve the dataset root, handling the nested chest_xray/chest_xray/ layout."""
+    data_path = Path(data_dir).resolve()
+    if (data_path / "chest_xray").exists():
+        data_path = data_path / "chest_xray"
+    return data_path
+
+
+def describe_image(path: Path) -> dict:
+    """Content hash and pixel dimensions of one image (dimensions come from the header only)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    with Image.open(path) as image:
+        width, height = image.size
+    return {"sha256": h.hexdigest(), "width": width, "height": height}
+
+
+def _describe_task(path: Path) -> tuple:
+    """describe_image() for the worker pool; returns (info or None, error message or None)."""
+    try:
+        return describe_image(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _manifest_path(root: Path, cache_dir: Path) -> Path:
+    key = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return cache_dir / f"manifest-{key}.json"
+
+
+def _load_cached(path: Path, root: Path) -> dict | None:
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if cached.get("version") != MANIFEST_VERSION or cached.get("root") != str(root):
+        return None
+    return cached
+
+
+def build_manifest(
+    data_dir: str,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    rescan: bool = False,
+    workers: int = 8,
+) -> list[dict]:
+    """
+    Return one entry per image in the dataset, using and refreshing the cached index.
+
+    Entry paths are relative to the dataset root; use resolve_path() to get
+    an absolute path.
+    """
+    root = dataset_root(data_dir)
+    cache_dir = Path(cache_dir)
+    manifest_path = _manifest_path(root, cache_dir)
+    cached = None if rescan else _load_cached(manifest_path, root)
+
+    previous = {}
+    if cached:
+        columns = cached["columns"]
+        for row in zip(*(columns[c] for c in COLUMNS)):
+            entry = dict(zip(COLUMNS, row))
+            previous.setdefault(str(Path(entry["path"]).parent), []).append(entry)
+
+    dir_mtimes = {}
+    entries, to_describe = [], []
+    for split in SPLITS:
+        for category, label in CATEGORIES.items():
+            rel_dir = f"{split}/{category}"
+            category_dir = root / rel_dir
+            if not category_dir.is_dir():
+                continue
+            mtime = category_dir.stat().st_mtime_ns
+            dir_mtimes[rel_dir] = mtime
+
+            known = {e["path"]: e for e in previous.get(rel_dir, [])}
+            if cached and cached["dirs"].get(rel_dir) == mtime:
+                # Unchanged directory: the same files, so no need to list it,
+                # but any of them may have been overwritten in place
+                names = [Path(path).name for path in known]
+            else:
+                with os.scandir(category_dir) as it:
+                    names = [f.name for f in it
+                             if f.is_file() and Path(f.name).suffix.lower() in IMAGE_SUFFIXES]
+
+            for name in names:
+                rel_path = f"{rel_dir}/{name}"
+                try:
+                    st = os.stat(root / rel_path)
+                except FileNotFoundError:
+                    continue
+                entry = known.get(rel_path)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    entries.append(entry)
+                    continue
+                entry = {"path": rel_path, "label": label, "split": split,
+                         "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                entries.append(entry)
+                to_describe.append(entry)
+
+    unreadable = []
+    if to_describe:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for entry, (info, error) in zip(to_describe, pool.map(lambda e: _describe_task(root / e["path"]), to_describe)):
+                if error is None:
+                    entry.update(info)
+                    continue
+                print(f"Warning: skipping unreadable image {root / entry['path']}: {error}")
+                unreadable.append(entry)
+                # Not recording the directory makes the next run list it and try the file again
+                dir_mtimes.pop(str(Path(entry["path"]).parent), None)
+    if unreadable:
+        skipped = {id(e) for e in unreadable}
+        entries = [e for e in entries if id(e) not in skipped]
+
+    entries.sort(key=lambda e: e["path"])
+
+    if to_describe or not cached or cached["dirs"] != dir_mtimes:
+        _save(manifest_path, root, dir_mtimes, entries)
+
+    return entries
+
+
+def _save(path: Path, root: Path, dir_mtimes: dict, entries: list[dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "version": MANIFEST_VERSION,
+        "root": str(root),
+        "dirs": dir_mtimes,
+        "columns": {c: [e[c] for e in entries] for c in COLUMNS},
+    }
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(document, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def resolve_path(data_dir: str, entry: dict) -> str:
+    """Absolute path of a manifest entry."""
+    return str(dataset_root(data_dir) / entry["path"])
+
+
+def stratified_sample(entries: list[dict], n: int, seed: int = 0) -> list[dict]:
+    """
+    Reproducibly sample `n` entries, keeping each label's share of the population.
+
+    Per-label quotas use largest-remainder rounding; within a label entries
+    are drawn with a seeded RNG from the path-sorted population, so the
+    same seed and dataset always give the same sample.
+    """
+    if n >= len(entries):
+        return list(entries)
+
+    by_label = {}
+    for entry in sorted(entries, key=lambda e: e["path"]):
+        by_label.setdefault(entry["label"], []).append(entry)
+
+    exact = {label: n * len(group) / len(entries) for label, group in by_label.items()}
+    quotas = {label: int(share) for label, share in exact.items()}
+    remainder = n - sum(quotas.values())
+    for label in sorted(exact, key=lambda l: (quotas[l] - exact[l], l))[:remainder]:
+        quotas[label] += 1
+
+    rng = random.Random(seed)
+    sample = []
+    for label in sorted(by_label):
+        sample.extend(rng.sample(by_label[label], quotas[label]))
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the cached CXR dataset manifest")
+    parser.add_argument("data_dir", help="Path to chest_xray dataset")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Manifest cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--rescan", action="store_true", help="Ignore the cached index and hash every image again")
+    args = parser.parse_args()
+
+    entries = build_manifest(args.data_dir, args.cache_dir, rescan=args.rescan)
+    counts = {}
+    for e in entries:
+        key = (e["split"], e["label"])
+        counts[key] = counts.get(key, 0) + 1
+    print(f"{len(entries)} images in {dataset_root(args.data_dir)}")
+    for (split, label), count in sorted(counts.items()):
+        print(f"  {split:5} {label:3} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for benchmark API responses.
+
+Entries are keyed by a SHA-256 over everything that determines the model's
+answer (image bytes, system prompt, model, max_tokens, user text), so
+re-running the benchmark after changing parsing or metrics code costs no
+API calls. The cache is bounded in size and evicts least-recently-used
+entries first.
+
+Layout:
+    <cache_dir>/<key[:2]>/<key>.json
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "cxr-pneumonia-benchmark" / "responses"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(*parts) -> str:
+    """Hash request parts into a cache key. Parts are length-prefixed so boundaries can't collide."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of JSON entries on disk.
+
+    Recency is tracked in memory and mirrored to file mtimes (bumped on every
+    hit), so the LRU order survives across runs. Safe to share between the
+    benchmark's worker threads.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total = 0
+        self._scan()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _scan(self) -> None:
+        """Rebuild the in-memory LRU index from the files on disk."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        found = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((st.st_mtime, path.stem, st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+
+    def get(self, key: str, accept=None) -> dict | None:
+        """
+        Return the cached entry for `key`, or None on a miss.
+
+        An entry that `accept(entry)` rejects is not usable by the caller and
+        is counted as a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+        if entry is None or (accept is not None and not accept(entry)):
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """Store `entry` under `key`, evicting old entries if the cache is over budget."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(entry).encode("utf-8")
+
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        with self._lock:
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for the benchmark report."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total,
+            }
@@ -8,9 +8,16 @@ Uses Claude API to analyze images with the structured workflow.
 Usage:
     python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --sample 50
     python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --full
+    python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --full --concurrency 8 --rpm 50
+    python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --full --output run.json --resume
+    python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --full --batch
+    python benchmark/run_benchmark.py --data-dir /path/to/chest_xray --sample 100 \
+        --variant claude-sonnet-4-20250514 --variant claude-sonnet-4-20250514=prompts/SKILL_v2.md
+    python benchmark/run_benchmark.py --dicom-dir /path/to/dicoms --sample 50
 
 Requirements:
-    pip install anthropic pillow
+    pip install anthropic pillow numpy
+    pip install pydicom            # only for --dicom-dir
 
 Environment:
     ANTHROPIC_API_KEY must be set
@@ -23,6 +30,9 @@ import os
 import random
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
@@ -31,18 +41,51 @@ try:
     from PIL import Image
 except ImportError as e:
     print(f"Missing dependency: {e}")
-    print("Install with: pip install anthropic pillow")
+    print("Install with: pip install anthropic pillow numpy")
     sys.exit(1)
 
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from manifest import DEFAULT_CACHE_DIR as DEFAULT_MANIFEST_DIR, CATEGORIES, build_manifest, dataset_root, resolve_path, stratified_sample
+from metrics import compute_metrics
+from preprocess import DEFAULT_CACHE_DIR as DEFAULT_IMAGE_CACHE_DIR, DEFAULT_MAX_EDGE, DEFAULT_QUALITY, Preprocessor
+from response_cache import DEFAULT_CACHE_DIR, ResponseCache, cache_key
+from variants import estimate_cost, parse_variant
+
 
 # Load the skill prompt
 SKILL_DIR = Path(__file__).parent.parent
 SKILL_MD = SKILL_DIR / "SKILL.md"
 
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 2000
+USER_PROMPT = "Analyze this chest X-ray for pneumonia following the 6-stage workflow. Provide your structured assessment."
+
+# HTTP statuses worth retrying. 429 (rate limited) and 529 (overloaded) also
+# pause every worker sharing the rate limiter, not just the one that hit them.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUS = {429, 529}
+
+# An error event in the middle of a stream arrives after a 200 response, so
+# it is classified by the error type in its body instead of the status.
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "rate_limit_error", "api_error"}
+THROTTLE_ERROR_TYPES = {"overloaded_error", "rate_limit_error"}
+
+# A connection dropped mid-stream surfaces as the HTTP library's own error,
+# not APIConnectionError. The SDK uses httpx, or its httpx2 fork in newer
+# releases; whichever it imported is in sys.modules.
+TRANSPORT_ERRORS = tuple(sys.modules[name].TransportError for name in ("httpx", "httpx2") if name in sys.modules)
+
+# Message Batches limits are 100,000 requests or 256 MB per batch; stay
+# under the byte limit to leave room for JSON overhead.
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
 
-def load_skill_prompt():
-    """Load the SKILL.md content as the system prompt."""
-    with open(SKILL_MD) as f:
+def load_skill_prompt(path: str = SKILL_MD):
+    """Load the SKILL.md content (or another prompt revision) as the system prompt."""
+    with open(path) as f:
         content = f.read()
 
     # Extract content after the YAML frontmatter
@@ -54,32 +97,244 @@ def load_skill_prompt():
     return content
 
 
-def encode_image(image_path: str) -> tuple[str, str]:
-    """Encode image to base64 and determine media type."""
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+def encode_image(image_path: str, preprocessor: Preprocessor = None) -> tuple[str, str]:
+    """
+    Encode image to base64 and determine media type, pre-processing it first if requested.
+
+    Anything that isn't a regular image file is treated as DICOM and converted
+    in memory (see encode_dicom_image()).
+    """
+    suffix = Path(image_path).suffix.lower()
+    if suffix not in MEDIA_TYPES:
+        return encode_dicom_image(image_path, preprocessor)
+
+    if preprocessor is not None:
+        data = base64.standard_b64encode(preprocessor.process(image_path)).decode("utf-8")
+        return data, "image/jpeg"
+
     with open(image_path, "rb") as f:
         data = base64.standard_b64encode(f.read()).decode("utf-8")
 
-    suffix = Path(image_path).suffix.lower()
-    media_type = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-    }.get(suffix, "image/jpeg")
-
-    return data, media_type
-
-
-def analyze_image(client: anthropic.Anthropic, image_path: str, skill_prompt: str) -> dict:
-    """Analyze a single CXR image using the skill workflow."""
-    image_data, media_type = encode_image(image_path)
-
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2000,
-        system=skill_prompt,
-        messages=[
+    return data, MEDIA_TYPES[suffix]
+
+
+def encode_dicom_image(dicom_path: str, preprocessor: Preprocessor = None) -> tuple[str, str]:
+    """
+    Window a DICOM file and encode it for upload without writing an intermediate PNG.
+
+    Uses the same windowing as scripts/dicom_to_png.py ("auto" preset). Without
+    a preprocessor the image is sent as 8-bit grayscale PNG.
+    """
+    from dicom_to_png import encode_dicom, render_dicom
+
+    if preprocessor is not None:
+        data = preprocessor.process_image(Image.fromarray(render_dicom(dicom_path)))
+        return base64.standard_b64encode(data).decode("utf-8"), "image/jpeg"
+    return base64.standard_b64encode(encode_dicom(dicom_path)).decode("utf-8"), "image/png"
+
+
+class EncodedImages:
+    """
+    Base64 payloads shared by every variant that analyzes the same image.
+
+    Each image is read, pre-processed and encoded once; the payload is dropped
+    after its last expected use so memory stays bounded on large runs.
+    """
+
+    def __init__(self, uses: dict[str, int], preprocessor: Preprocessor = None):
+        self.preprocessor = preprocessor
+        self._uses = dict(uses)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, image_path: str) -> tuple[str, str]:
+        """Return (base64 data, media type) for `image_path`, encoding it on first use."""
+        with self._lock:
+            entry = self._entries.setdefault(image_path, {"lock": threading.Lock(), "value": None})
+        with entry["lock"]:
+            if entry["value"] is None:
+                entry["value"] = encode_image(image_path, self.preprocessor)
+            return entry["value"]
+
+    def release(self, image_path: str) -> None:
+        """Mark one use of `image_path` as finished."""
+        with self._lock:
+            self._uses[image_path] = self._uses.get(image_path, 1) - 1
+            if self._uses[image_path] <= 0:
+                self._entries.pop(image_path, None)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all benchmark workers.
+
+    Allows `rate` request starts per second with bursts of up to `burst`.
+    A rate of None disables the limit but still honours pauses requested via
+    `throttle()`, so a 429 on one worker backs off the whole pool.
+    """
+
+    def __init__(self, rate: float = None, burst: int = 1):
+        self.rate = rate
+        self.max_rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may start."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, delay: float) -> None:
+        """Pause all workers for `delay` seconds and halve the request rate."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            if self.rate is not None:
+                self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def recover(self) -> None:
+        """Step the request rate back towards its configured maximum after a success."""
+        with self._lock:
+            if self.rate is not None and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Seconds to wait before retrying: the server's retry-after, else jittered exponential backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def error_type(error: Exception) -> str:
+    """The API error type ("overloaded_error", ...) from an error's body, or None."""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict) and isinstance(body.get("error"), dict):
+        return body["error"].get("type")
+    return None
+
+
+def call_with_backoff(fn, limiter: TokenBucket = None, max_retries: int = 6, stats: dict = None):
+    """
+    Call `fn()` under the rate limiter, retrying rate-limit, overload and transient errors.
+
+    Errors raised while reading a streamed response are retried the same
+    way as the equivalent HTTP status. If `stats` is given, its "retries"
+    entry is set to the number of retries made.
+    """
+    attempt = 0
+    while True:
+        if stats is not None:
+            stats["retries"] = attempt
+        if limiter:
+            limiter.acquire()
+        try:
+            result = fn()
+        except (anthropic.APIStatusError, anthropic.APIConnectionError, *TRANSPORT_ERRORS) as e:
+            status, kind = getattr(e, "status_code", None), error_type(e)
+            retryable = (not isinstance(e, anthropic.APIStatusError)
+                         or status in RETRYABLE_STATUS or kind in RETRYABLE_ERROR_TYPES)
+            if not retryable or attempt >= max_retries:
+                raise
+            delay = retry_delay(e, attempt)
+            if limiter and (status in THROTTLE_STATUS or kind in THROTTLE_ERROR_TYPES):
+                limiter.throttle(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+            continue
+        if limiter:
+            limiter.recover()
+        return result
+
+
+def stream_message(
+    client: anthropic.Anthropic,
+    params: dict,
+    early_stop: bool = False,
+    keep_full_text: bool = False,
+) -> tuple[object, dict]:
+    """
+    Send a request over the streaming API.
+
+    Returns the message and its timing: time to the first streamed event
+    (TTFB), total latency, and the time at which the Pneumonia and
+    Confidence lines had both been received. With `early_stop`, the stream
+    is closed as soon as that verdict is complete, cancelling the rest of
+    the generation, and the partial message is returned; `keep_full_text`
+    still records the verdict time but reads the response to the end.
+    """
+    start = time.perf_counter()
+    timing = {"ttfb_s": None, "verdict_s": None, "stopped_early": False}
+    text = ""
+    with client.messages.stream(**params) as stream:
+        for event in stream:
+            if timing["ttfb_s"] is None:
+                timing["ttfb_s"] = time.perf_counter() - start
+            if (early_stop or keep_full_text) and timing["verdict_s"] is None and event.type == "text":
+                text += event.text
+                if "\n" in event.text and verdict_complete(text):
+                    timing["verdict_s"] = time.perf_counter() - start
+                    if early_stop and not keep_full_text:
+                        timing["stopped_early"] = True
+                        break
+        message = stream.current_message_snapshot if timing["stopped_early"] else stream.get_final_message()
+    timing["latency_s"] = time.perf_counter() - start
+    return message, timing
+
+
+def build_request(
+    image_data: str,
+    media_type: str,
+    skill_prompt: str,
+    prompt_cache: bool = True,
+    model: str = MODEL,
+) -> dict:
+    """
+    Build the Messages API parameters for one base64-encoded image.
+
+    With `prompt_cache`, the system prompt is marked as a cacheable prefix so
+    that after the first request the SKILL.md tokens are read from the
+    prompt cache instead of being processed again.
+    """
+    system = skill_prompt
+    if prompt_cache:
+        system = [{"type": "text", "text": skill_prompt, "cache_control": {"type": "ephemeral"}}]
+
+    return {
+        "model": model,
+        "max_tokens": MAX_TOKENS,
+        "system": system,
+        "messages": [
             {
                 "role": "user",
                 "content": [
@@ -93,20 +348,188 @@ def analyze_image(client: anthropic.Anthropic, image_path: str, skill_prompt: st
                     },
                     {
                         "type": "text",
-                        "text": "Analyze this chest X-ray for pneumonia following the 6-stage workflow. Provide your structured assessment.",
+                        "text": USER_PROMPT,
                     },
                 ],
             }
         ],
-    )
+    }
 
-    response_text = message.content[0].text
 
-    # Parse the assessment from the response
+def usage_record(usage) -> dict:
+    """Token counts from an API response's usage block, including prompt cache reads and writes."""
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+    }
+
+
+def summarize_usage(results: list[dict]) -> dict:
+    """Total token usage across a run and the share of prompt tokens served from the prompt cache."""
+    usages = [r["usage"] for r in results if r and r.get("usage")]
+    totals = {key: sum(u[key] for u in usages) for key in (
+        "input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")}
+    prompt_tokens = totals["input_tokens"] + totals["cache_read_input_tokens"] + totals["cache_creation_input_tokens"]
+    return {
+        "requests": len(usages),
+        **totals,
+        "requests_with_cache_read": sum(1 for u in usages if u["cache_read_input_tokens"]),
+        "prompt_cache_hit_rate": totals["cache_read_input_tokens"] / prompt_tokens if prompt_tokens else 0,
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    """The q-th percentile (0-100) of `values`, linearly interpolated."""
+    values = sorted(values)
+    if not values:
+        return None
+    pos = (len(values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def summarize_performance(results: list[dict], wall_time: float, images_run: int) -> dict:
+    """
+    Latency percentiles, throughput and token totals for a run.
+
+    Latency and TTFB cover requests answered by the API in this session
+    (not response cache hits or batch results). Throughput counts every
+    image processed in this session over its wall-clock time.
+    """
+    timings = [r["timing"] for r in results if r and r.get("timing")]
+    latencies = [t["latency_s"] for t in timings]
+    ttfbs = [t["ttfb_s"] for t in timings if t["ttfb_s"] is not None]
+    usages = [r["usage"] for r in results if r and r.get("usage")]
+
+    def spread(values):
+        return {
+            "mean": sum(values) / len(values) if values else None,
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+
+    verdicts = [t["verdict_s"] for t in timings if t.get("verdict_s") is not None]
+    early = {}
+    if verdicts:
+        early = {
+            "verdict_s": spread(verdicts),
+            "stopped_early": sum(1 for t in timings if t.get("stopped_early")),
+        }
+
+    return {
+        "wall_time_s": wall_time,
+        "images": images_run,
+        "throughput_images_per_min": images_run / wall_time * 60 if wall_time > 0 else 0,
+        "timed_requests": len(timings),
+        "latency_s": spread(latencies),
+        "ttfb_s": spread(ttfbs),
+        "retries": sum(t["retries"] for t in timings),
+        "total_tokens": sum(u["input_tokens"] + u["output_tokens"] + u["cache_read_input_tokens"]
+                            + u["cache_creation_input_tokens"] for u in usages),
+        **early,
+    }
+
+
+def summarize_payload(results: list[dict], accuracy: float, preprocessor: Preprocessor = None) -> dict:
+    """
+    Image bytes sent over the wire next to the accuracy they bought.
+
+    Comparing this block across runs with different --max-edge / --jpeg-quality
+    settings shows the cheapest resolution that keeps accuracy. Sizes are
+    base64 payload bytes; `original_bytes` is what the unprocessed files
+    would have cost.
+    """
+    sent = [(r["image_path"], r["bytes_sent"]) for r in results if r and r.get("bytes_sent")]
+    bytes_sent = sum(size for _, size in sent)
+    original_bytes = sum((os.path.getsize(path) + 2) // 3 * 4 for path, _ in sent)
+    return {
+        "preprocess": preprocessor.settings() if preprocessor else None,
+        "images": len(sent),
+        "bytes_sent": bytes_sent,
+        "mean_bytes_per_image": bytes_sent / len(sent) if sent else 0,
+        "original_bytes": original_bytes,
+        "reduction": 1 - bytes_sent / original_bytes if original_bytes else 0,
+        "accuracy": accuracy,
+    }
+
+
+def response_assessment(response_text: str, image_path: str) -> dict:
+    """Parse a model response into an assessment record for `image_path`."""
     assessment = parse_assessment(response_text)
     assessment["raw_response"] = response_text
     assessment["image_path"] = str(image_path)
+    return assessment
+
 
+def analyze_image(
+    client: anthropic.Anthropic,
+    image_path: str,
+    skill_prompt: str,
+    limiter: TokenBucket = None,
+    max_retries: int = 6,
+    cache: ResponseCache = None,
+    prompt_cache: bool = True,
+    preprocessor: Preprocessor = None,
+    early_stop: bool = False,
+    keep_full_text: bool = False,
+    model: str = MODEL,
+    image: tuple[str, str] = None,
+) -> dict:
+    """
+    Analyze a single CXR image using the skill workflow.
+
+    If `cache` is given, a response previously produced for the same image
+    bytes, prompt, model and settings is reused instead of calling the API.
+    Responses cut short by `early_stop` are only reused by other early-stop
+    runs that don't ask for the full text.
+
+    `image` may carry an already encoded (base64 data, media type) payload.
+    """
+    image_data, media_type = image or encode_image(image_path, preprocessor)
+
+    key = cache_key(image_data, skill_prompt, model, MAX_TOKENS, USER_PROMPT) if cache else None
+    entry = cache.get(key, accept=lambda e: e.get("complete", True) or (early_stop and not keep_full_text)) if cache else None
+    if entry is not None:
+        assessment = response_assessment(entry["response"], image_path)
+        assessment["cached"] = True
+        assessment["bytes_sent"] = len(image_data)
+        return assessment
+
+    params = build_request(image_data, media_type, skill_prompt, prompt_cache, model)
+    stats = {}
+    started = time.perf_counter()
+    message, timing = call_with_backoff(
+        lambda: stream_message(client, params, early_stop, keep_full_text), limiter, max_retries, stats)
+
+    response_text = message.content[0].text if message.content else ""
+    if cache:
+        cache.put(key, {
+            "response": response_text,
+            "model": model,
+            "complete": not timing["stopped_early"],
+            "created_at": datetime.now().isoformat(),
+        })
+
+    assessment = response_assessment(response_text, image_path)
+    # For early-stopped responses output_tokens only covers what was
+    # reported before the stream was closed.
+    assessment["usage"] = usage_record(message.usage)
+    assessment["bytes_sent"] = len(image_data)
+    assessment["timing"] = {
+        "latency_s": timing["latency_s"],
+        "ttfb_s": timing["ttfb_s"],
+        # Including retries and time spent waiting on the rate limiter
+        "elapsed_s": time.perf_counter() - started,
+        "retries": stats["retries"],
+    }
+    if early_stop or keep_full_text:
+        assessment["timing"]["verdict_s"] = timing["verdict_s"]
+        assessment["timing"]["stopped_early"] = timing["stopped_early"]
     return assessment
 
 
@@ -133,6 +556,14 @@ def parse_assessment(response: str) -> dict:
     return assessment
 
 
+def verdict_complete(text: str) -> bool:
+    """True once `text` contains a parseable Pneumonia verdict and a fully received Confidence line."""
+    assessment = parse_assessment(text)
+    if assessment["pneumonia"] is None or assessment["confidence"] is None:
+        return False
+    return re.search(r"\*\*Confidence:\*\*[^\n]*\n", text) is not None
+
+
 def get_ground_truth(image_path: str) -> str:
     """Get ground truth label from directory structure."""
     # Kaggle dataset structure: chest_xray/{train,test,val}/{NORMAL,PNEUMONIA}/image.jpeg
@@ -144,142 +575,376 @@ def get_ground_truth(image_path: str) -> str:
     return "UNKNOWN"
 
 
-def collect_images(data_dir: str, split: str = "test") -> list[tuple[str, str]]:
-    """Collect image paths and labels from dataset."""
-    data_path = Path(data_dir)
-
-    # Handle nested structure (chest_xray/chest_xray/)
-    if (data_path / "chest_xray").exists():
-        data_path = data_path / "chest_xray"
-
-    images = []
-
-    for category in ["NORMAL", "PNEUMONIA"]:
+def collect_images(
+    data_dir: str,
+    split: str = "test",
+    manifest_cache_dir: str = DEFAULT_MANIFEST_DIR,
+) -> list[tuple[str, str]]:
+    """
+    Collect image paths and labels from the dataset manifest.
+
+    Sample the result with manifest.stratified_sample() (as run_benchmark()
+    does for --sample) to get the same seeded selection on every run.
+    """
+    data_path = dataset_root(data_dir)
+    for category in CATEGORIES:
         category_dir = data_path / split / category
         if not category_dir.exists():
             print(f"Warning: {category_dir} not found")
-            continue
 
-        label = "NO" if category == "NORMAL" else "YES"
+    entries = [e for e in build_manifest(data_dir, manifest_cache_dir) if e["split"] == split]
+    return [(resolve_path(data_dir, e), e["label"]) for e in entries]
 
-        for img_path in category_dir.glob("*.jpeg"):
-            images.append((str(img_path), label))
-        for img_path in category_dir.glob("*.jpg"):
-            images.append((str(img_path), label))
-        for img_path in category_dir.glob("*.png"):
-            images.append((str(img_path), label))
 
-    return images
+def collect_dicom_images(dicom_dir: str) -> list[tuple[str, str]]:
+    """
+    Collect DICOM files under `dicom_dir`, labelled by their parent directory name.
 
+    Lay the archive out as .../NORMAL/* and .../PNEUMONIA/* (see
+    get_ground_truth()); files elsewhere are labelled UNKNOWN and left out of
+    the metrics. Sample the result as for collect_images().
+    """
+    from dicom_to_png import find_dicom_files
 
-def calculate_metrics(results: list[dict]) -> dict:
-    """Calculate accuracy, precision, recall, F1."""
-    tp = fp = tn = fn = 0
+    return [(str(p), get_ground_truth(str(p))) for p in find_dicom_files(dicom_dir)]
 
-    for r in results:
-        pred = r.get("prediction")
-        truth = r.get("ground_truth")
 
-        if pred is None or truth == "UNKNOWN":
-            continue
+def calculate_metrics(results: list[dict], n_bootstrap: int = 2000) -> dict:
+    """
+    Calculate accuracy, precision, recall, F1, with bootstrap CIs and a confidence-threshold ROC.
 
-        if pred == "YES" and truth == "YES":
-            tp += 1
-        elif pred == "YES" and truth == "NO":
-            fp += 1
-        elif pred == "NO" and truth == "NO":
-            tn += 1
-        elif pred == "NO" and truth == "YES":
-            fn += 1
-
-    total = tp + fp + tn + fn
-    accuracy = (tp + tn) / total if total > 0 else 0
-    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+    See metrics.compute_metrics() for the vectorized implementation.
+    """
+    return compute_metrics(results, n_bootstrap=n_bootstrap)
 
-    return {
-        "total": total,
-        "accuracy": accuracy,
-        "precision": precision,
-        "recall": recall,
-        "f1": f1,
-        "tp": tp,
-        "fp": fp,
-        "tn": tn,
-        "fn": fn,
-        "indeterminate": sum(1 for r in results if r.get("prediction") == "INDETERMINATE"),
-    }
-
-
-def run_benchmark(
-    data_dir: str,
-    sample_size: int = None,
-    split: str = "test",
-    output_file: str = None,
-) -> dict:
-    """Run the full benchmark."""
-    # Initialize client
-    client = anthropic.Anthropic()
 
-    # Load skill
-    skill_prompt = load_skill_prompt()
-    print(f"Loaded skill prompt ({len(skill_prompt)} chars)")
+def evaluate_image(
+    client: anthropic.Anthropic,
+    img_path: str,
+    label: str,
+    skill_prompt: str,
+    limiter: TokenBucket = None,
+    max_retries: int = 6,
+    cache: ResponseCache = None,
+    prompt_cache: bool = True,
+    preprocessor: Preprocessor = None,
+    early_stop: bool = False,
+    keep_full_text: bool = False,
+    model: str = MODEL,
+    image: tuple[str, str] = None,
+) -> tuple[dict, list[str]]:
+    """Analyze one image and score it against its label, returning the result and its log lines."""
+    try:
+        assessment = analyze_image(client, img_path, skill_prompt, limiter, max_retries, cache,
+                                   prompt_cache, preprocessor, early_stop, keep_full_text, model, image)
+    except Exception as e:
+        return failed_result(img_path, label, e)
+    return score_assessment(assessment, label)
 
-    # Collect images
-    images = collect_images(data_dir, split)
-    print(f"Found {len(images)} images in {split} set")
 
-    if not images:
-        print("ERROR: No images found. Check data directory structure.")
-        sys.exit(1)
-
-    # Sample if requested
-    if sample_size and sample_size < len(images):
-        images = random.sample(images, sample_size)
-        print(f"Sampled {sample_size} images")
+def score_assessment(assessment: dict, label: str) -> tuple[dict, list[str]]:
+    """Attach the ground truth and prediction to an assessment, returning it with its log lines."""
+    img_path = assessment["image_path"]
+    log = [f"Analyzing: {Path(img_path).name}", f"  Ground truth: {label}"]
 
-    # Run analysis
-    results = []
-    for i, (img_path, label) in enumerate(images):
-        print(f"\n[{i+1}/{len(images)}] Analyzing: {Path(img_path).name}")
-        print(f"  Ground truth: {label}")
+    assessment["ground_truth"] = label
+    assessment["prediction"] = assessment.get("pneumonia")
 
-        try:
-            assessment = analyze_image(client, img_path, skill_prompt)
-            assessment["ground_truth"] = label
-            assessment["prediction"] = assessment.get("pneumonia")
+    log.append(f"  Prediction: {assessment.get('pneumonia')} (confidence: {assessment.get('confidence')})"
+               + (" [cached]" if assessment.get("cached") else ""))
 
-            print(f"  Prediction: {assessment.get('pneumonia')} (confidence: {assessment.get('confidence')})")
+    correct = assessment.get("pneumonia") == label
+    log.append(f"  {'CORRECT' if correct else 'INCORRECT'}")
 
-            correct = assessment.get("pneumonia") == label
-            print(f"  {'CORRECT' if correct else 'INCORRECT'}")
+    return assessment, log
 
-            results.append(assessment)
 
-        except Exception as e:
-            print(f"  ERROR: {e}")
-            results.append({
-                "image_path": img_path,
-                "ground_truth": label,
-                "prediction": None,
-                "error": str(e),
-            })
-
-    # Calculate metrics
-    metrics = calculate_metrics(results)
+def failed_result(img_path: str, label: str, error) -> tuple[dict, list[str]]:
+    """Result record for an image whose analysis failed."""
+    log = [f"Analyzing: {Path(img_path).name}", f"  Ground truth: {label}", f"  ERROR: {error}"]
+    return {
+        "image_path": img_path,
+        "ground_truth": label,
+        "prediction": None,
+        "error": str(error),
+    }, log
+
+
+class ResultJournal:
+    """
+    Append-only JSONL log of a benchmark run.
+
+    The first line records the run (data dir, split and the exact image list,
+    so a resumed run sees the same sample); every following line is one
+    completed result tagged with its index, or a submitted message batch and
+    the indices it covers. Lines are flushed and fsynced as they are written,
+    so an interrupted run loses at most the requests that were in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.batches = {}  # batch id -> image indices, from load()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> tuple[dict, dict[int, dict]]:
+        """Read the run header and the results recorded so far, keyed by image index."""
+        header, results = None, {}
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a partial last line
+                    continue
+                if record.get("type") == "run":
+                    header = record
+                elif record.get("type") == "result":
+                    results[record["index"]] = record["result"]
+                elif record.get("type") == "batch":
+                    self.batches[record["id"]] = record["indices"]
+                elif record.get("type") == "batch_done":
+                    self.batches.pop(record["id"], None)
+        if header is None:
+            raise ValueError(f"Journal {self.path} has no run header")
+        return header, results
+
+    def start(self, header: dict = None) -> None:
+        """Open the journal for appending, writing `header` first for a new run."""
+        if self.path.exists():
+            self._drop_torn_line()
+        self._file = open(self.path, "a")
+        if header is not None:
+            self._write({"type": "run", **header})
+
+    def _drop_torn_line(self) -> None:
+        """Cut off a partial last line left by a crash, so the next record starts on a line of its own."""
+        with open(self.path, "r+b") as f:
+            size = end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                step = min(end, 64 * 1024)
+                f.seek(end - step)
+                newline = f.read(step).rfind(b"\n")
+                if newline >= 0:
+                    end += newline + 1 - step
+                    break
+                end -= step
+            if end < size:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, index: int, result: dict) -> None:
+        """Record one completed result."""
+        with self._lock:
+            self._write({"type": "result", "index": index, "result": result})
+
+    def record_batch(self, batch_id: str, indices: list[int]) -> None:
+        """Record a submitted message batch so a resumed run polls it instead of resubmitting."""
+        with self._lock:
+            self._write({"type": "batch", "id": batch_id, "indices": indices})
+
+    def finish_batch(self, batch_id: str) -> None:
+        """Mark a batch's results as collected; failed images in it are resubmitted on resume."""
+        with self._lock:
+            self._write({"type": "batch_done", "id": batch_id})
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+def run_jobs(jobs: list, worker, concurrency: int = 1, warmup: int = 0):
+    """
+    Run `worker` over `jobs`, yielding (index, result) pairs as they complete.
+
+    With concurrency 1 jobs run inline in order; otherwise up to `concurrency`
+    jobs are in flight at once on a thread pool. The first `warmup` jobs
+    (one per variant) finish before the rest start, so the prompt cache entry
+    each writes is available to every later request instead of each of the
+    first `concurrency` requests writing its own.
+    """
+    if concurrency <= 1:
+        for i, job in enumerate(jobs):
+            yield i, worker(job)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        warmup = min(warmup, len(jobs))
+        for stage in (range(warmup), range(warmup, len(jobs))):
+            futures = {pool.submit(worker, jobs[i]): i for i in stage}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    finally:
+        # On Ctrl-C drop queued jobs instead of draining the whole split
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def submit_batch(client: anthropic.Anthropic, requests: list[dict]) -> str:
+    """Create one message batch and return its id."""
+    batch = call_with_backoff(lambda: client.messages.batches.create(requests=requests))
+    print(f"Submitted batch {batch.id} ({len(requests)} requests)")
+    return batch.id
+
+
+def wait_for_batch(client: anthropic.Anthropic, batch_id: str, poll_interval: float = 30) -> None:
+    """Poll a message batch until it has finished processing."""
+    while True:
+        batch = call_with_backoff(lambda: client.messages.batches.retrieve(batch_id))
+        if batch.processing_status == "ended":
+            return
+        counts = batch.request_counts
+        print(f"  Batch {batch_id}: {counts.processing} processing, "
+              f"{counts.succeeded + counts.errored + counts.canceled + counts.expired} done")
+        time.sleep(poll_interval)
+
+
+def run_batch_jobs(
+    client: anthropic.Anthropic,
+    jobs: dict[int, tuple[str, str, dict]],
+    cache: ResponseCache = None,
+    journal: ResultJournal = None,
+    poll_interval: float = 30,
+    max_batch_bytes: int = MAX_BATCH_BYTES,
+    prompt_cache: bool = True,
+    images: EncodedImages = None,
+):
+    """
+    Analyze images through the Message Batches API.
+
+    `jobs` maps job index to (image path, label, variant), where the variant
+    supplies the model and system prompt. Cache hits are resolved
+    immediately; the remaining requests are packed into as few batches as
+    the size limits allow, submitted, polled and mapped back by custom_id.
+    Batches already recorded in the journal are polled rather than
+    resubmitted. Yields (index, (result, log)) like run_jobs().
+    """
+    images = images or EncodedImages({})
+    jobs = dict(jobs)
+    open_batches = {}
+    if journal is not None:
+        for batch_id, indices in journal.batches.items():
+            indices = [i for i in indices if i in jobs]
+            if indices:
+                open_batches[batch_id] = indices
+
+    in_flight = {i for indices in open_batches.values() for i in indices}
+    keys, sizes = {}, {}
+    requests, size = [], 0
+
+    def flush():
+        nonlocal requests, size
+        batch_id = submit_batch(client, requests)
+        indices = [int(r["custom_id"].split("-")[1]) for r in requests]
+        open_batches[batch_id] = indices
+        if journal is not None:
+            journal.record_batch(batch_id, indices)
+        requests, size = [], 0
+
+    for i, (img_path, label, variant) in jobs.items():
+        if i in in_flight:
+            continue
+        image_data, media_type = images.get(img_path)
+        images.release(img_path)
+        skill_prompt, model = variant["prompt"], variant["model"]
+        key = cache_key(image_data, skill_prompt, model, MAX_TOKENS, USER_PROMPT) if cache else None
+        # Batch responses are always full text, so early-stopped entries are misses
+        entry = cache.get(key, accept=lambda e: e.get("complete", True)) if cache else None
+        if entry is not None:
+            assessment = response_assessment(entry["response"], img_path)
+            assessment["cached"] = True
+            assessment["bytes_sent"] = len(image_data)
+            yield i, score_assessment(assessment, label)
+            continue
 
-    # Create report
-    report = {
-        "timestamp": datetime.now().isoformat(),
-        "data_dir": data_dir,
-        "split": split,
-        "sample_size": len(images),
+        keys[i] = key
+        sizes[i] = len(image_data)
+        request = {"custom_id": f"job-{i}", "params": build_request(image_data, media_type, skill_prompt, prompt_cache, model)}
+        request_size = len(image_data) + len(skill_prompt) + 1024
+        if requests and (size + request_size > max_batch_bytes or len(requests) >= MAX_BATCH_REQUESTS):
+            flush()
+        requests.append(request)
+        size += request_size
+    if requests:
+        flush()
+
+    for batch_id, indices in open_batches.items():
+        pending = set(indices)
+        try:
+            wait_for_batch(client, batch_id, poll_interval)
+            # Read the whole results file inside the retry, so a connection
+            # dropped mid-download refetches it instead of losing the batch
+            entries = call_with_backoff(lambda: list(client.messages.batches.results(batch_id)))
+        except anthropic.NotFoundError:
+            # Batch results are only kept for a limited time
+            entries = []
+
+        for entry in entries:
+            i = int(entry.custom_id.split("-")[1])
+            if i not in pending:
+                continue
+            pending.discard(i)
+            img_path, label, variant = jobs[i]
+
+            if entry.result.type != "succeeded":
+                error = getattr(getattr(entry.result, "error", None), "error", None)
+                message = getattr(error, "message", None) or entry.result.type
+                yield i, failed_result(img_path, label, f"batch request {entry.result.type}: {message}")
+                continue
+
+            response_text = entry.result.message.content[0].text
+            if cache and keys.get(i):
+                cache.put(keys[i], {"response": response_text, "model": variant["model"], "complete": True,
+                                    "created_at": datetime.now().isoformat()})
+            assessment = response_assessment(response_text, img_path)
+            assessment["usage"] = usage_record(entry.result.message.usage)
+            if i in sizes:
+                assessment["bytes_sent"] = sizes[i]
+            yield i, score_assessment(assessment, label)
+
+        for i in sorted(pending):
+            img_path, label, _ = jobs[i]
+            yield i, failed_result(img_path, label, f"missing from batch {batch_id} results")
+        if journal is not None:
+            journal.finish_batch(batch_id)
+
+
+def summarize_variant(
+    results: list[dict],
+    new_results: list[dict],
+    wall_time: float,
+    model: str,
+    preprocessor: Preprocessor = None,
+    n_bootstrap: int = 2000,
+    batch: bool = False,
+) -> dict:
+    """
+    Metrics, usage, payload, performance and estimated cost for one variant's results.
+
+    `new_results` are the ones produced in this session (not carried over by
+    --resume), which are the only ones timed.
+    """
+    metrics = calculate_metrics(results, n_bootstrap)
+    usage = summarize_usage(results)
+    return {
         "metrics": metrics,
-        "results": results,
+        "usage": usage,
+        "payload": summarize_payload(results, metrics["accuracy"], preprocessor),
+        "performance": summarize_performance(new_results, wall_time, len(new_results)),
+        "cost_usd": estimate_cost(usage, model, batch),
     }
 
-    # Print summary
+
+def print_summary(report: dict) -> None:
+    """Print the results block for a single-variant report."""
+    metrics = report["metrics"]
     print("\n" + "=" * 60)
     print("BENCHMARK RESULTS")
     print("=" * 60)
@@ -288,16 +953,285 @@ def run_benchmark(
     print(f"Precision: {metrics['precision']:.1%}")
     print(f"Recall: {metrics['recall']:.1%}")
     print(f"F1 Score: {metrics['f1']:.1%}")
+    print(f"ROC AUC (confidence-weighted): {metrics['roc']['auc']:.3f}")
+    if "ci" in metrics:
+        ci = metrics["ci"]
+        print(f"{ci['level']:.0%} bootstrap CIs ({ci['resamples']} resamples):")
+        for name in ("accuracy", "precision", "recall", "f1", "auc"):
+            low, high = ci[name]
+            print(f"  {name}: {low:.3f} - {high:.3f}")
     print(f"\nConfusion Matrix:")
     print(f"  TP: {metrics['tp']} | FP: {metrics['fp']}")
     print(f"  FN: {metrics['fn']} | TN: {metrics['tn']}")
     print(f"\nIndeterminate: {metrics['indeterminate']}")
+    usage = report["usage"]
+    if usage["requests"]:
+        print(f"\nTokens: {usage['input_tokens']} input, {usage['output_tokens']} output")
+        print(f"Prompt cache: {usage['cache_read_input_tokens']} read, {usage['cache_creation_input_tokens']} written "
+              f"({usage['prompt_cache_hit_rate']:.0%} of prompt tokens from cache)")
+        if report["cost_usd"] is not None:
+            print(f"Estimated cost: ${report['cost_usd']:.2f}")
+    perf = report["performance"]
+    print(f"\nThroughput: {perf['throughput_images_per_min']:.1f} images/min over {perf['wall_time_s']:.0f}s")
+    if perf["timed_requests"]:
+        lat = perf["latency_s"]
+        print(f"Latency: p50 {lat['p50']:.1f}s | p90 {lat['p90']:.1f}s | p99 {lat['p99']:.1f}s "
+              f"({perf['retries']} retries)")
+    if perf.get("verdict_s"):
+        print(f"Time to verdict: p50 {perf['verdict_s']['p50']:.1f}s ({perf['stopped_early']} streams stopped early)")
+    payload = report["payload"]
+    if payload["images"]:
+        print(f"Image payload: {payload['bytes_sent'] / 1e6:.1f} MB sent "
+              f"({payload['mean_bytes_per_image'] / 1e3:.0f} KB/image, {payload['reduction']:.0%} below original)")
+    if "cache" in report:
+        print(f"Response cache: {report['cache']['hits']} hits, {report['cache']['misses']} misses")
     print("=" * 60)
     print(f"\nBaseline comparison:")
     print(f"  Naive zero-shot: ~58%")
     print(f"  Our result: {metrics['accuracy']:.1%}")
     print(f"  Target (GPT-4o best): >74%")
 
+
+def print_comparison(report: dict) -> None:
+    """Print a side-by-side table for a multi-variant report."""
+    print("\n" + "=" * 100)
+    print("BENCHMARK RESULTS")
+    print("=" * 100)
+    print(f"{'Variant':<44} {'Acc':>6} {'F1':>6} {'AUC':>6} {'p50 lat':>8} {'p90 lat':>8} {'Tokens':>10} {'Cost':>8}")
+    for v in report["variants"]:
+        m, perf = v["metrics"], v["performance"]
+        p50, p90 = perf["latency_s"]["p50"], perf["latency_s"]["p90"]
+        tokens = sum(v["usage"][k] for k in ("input_tokens", "output_tokens", "cache_read_input_tokens",
+                                             "cache_creation_input_tokens"))
+        cost = f"${v['cost_usd']:.2f}" if v["cost_usd"] is not None else "-"
+        print(f"{v['name'][:44]:<44} {m['accuracy']:>6.1%} {m['f1']:>6.1%} {m['roc']['auc']:>6.3f} "
+              f"{(f'{p50:.1f}s' if p50 is not None else '-'):>8} {(f'{p90:.1f}s' if p90 is not None else '-'):>8} "
+              f"{tokens:>10} {cost:>8}")
+    perf = report["performance"]
+    print(f"\nThroughput: {perf['throughput_images_per_min']:.1f} requests/min over {perf['wall_time_s']:.0f}s")
+    if "cache" in report:
+        print(f"Response cache: {report['cache']['hits']} hits, {report['cache']['misses']} misses")
+    print("=" * 100)
+
+
+def run_benchmark(
+    data_dir: str,
+    sample_size: int = None,
+    split: str = "test",
+    output_file: str = None,
+    concurrency: int = 1,
+    rpm: float = None,
+    max_retries: int = 6,
+    journal_file: str = None,
+    resume: bool = False,
+    cache_dir: str = None,
+    cache_max_bytes: int = None,
+    batch: bool = False,
+    poll_interval: float = 30,
+    prompt_cache: bool = True,
+    preprocessor: Preprocessor = None,
+    early_stop: bool = False,
+    keep_full_text: bool = False,
+    n_bootstrap: int = 2000,
+    seed: int = 0,
+    manifest_cache_dir: str = DEFAULT_MANIFEST_DIR,
+    variants: list[dict] = None,
+    dicom_dir: str = None,
+    client: anthropic.Anthropic = None,
+) -> dict:
+    """
+    Run the full benchmark.
+
+    Each result is appended to `journal_file` (default: the output file with a
+    .jsonl suffix) as soon as it completes. With `resume`, the image list is
+    taken from the existing journal and only images without a successful
+    result are analyzed again.
+
+    Responses are cached under `cache_dir` (None disables the cache).
+
+    With `batch`, images are sent through the Message Batches API instead of
+    one request at a time; the report has the same schema either way.
+
+    With `prompt_cache`, the SKILL.md system prompt is sent as a cacheable
+    prefix and per-request prompt cache reads/writes are recorded.
+
+    With a `preprocessor`, images are resized and re-encoded before upload.
+
+    With `early_stop`, each response stream is closed once the verdict has
+    been parsed (see stream_message()). Not applicable to batch runs.
+
+    `variants` lists (model, prompt file) combinations to compare (see
+    variants.parse_variant()); every image is analyzed once per variant
+    through the same worker pool, and the report gets a per-variant block
+    instead of top-level metrics. Defaults to MODEL with SKILL.md.
+
+    With `dicom_dir`, DICOM files found under it are evaluated instead of the
+    Kaggle dataset, labelled by parent directory name and converted in
+    memory as they are sent (see encode_dicom_image()).
+    """
+    # Initialize client. Retries are handled by call_with_backoff() so that
+    # rate-limit backoff is coordinated across workers.
+    if client is None:
+        client = anthropic.Anthropic(max_retries=0)
+
+    if journal_file is None and output_file:
+        journal_file = str(Path(output_file).with_suffix(".jsonl"))
+    journal = ResultJournal(journal_file) if journal_file else None
+    done_results = {}
+
+    if resume:
+        if journal is None or not journal.path.exists():
+            print(f"ERROR: Nothing to resume, journal not found: {journal_file}")
+            print("Pass the --output (or --journal) of the interrupted run.")
+            sys.exit(1)
+        header, done_results = journal.load()
+        images = [tuple(image) for image in header["images"]]
+        variants = header.get("variants") or variants
+        # Failed requests are retried rather than carried over
+        done_results = {i: r for i, r in done_results.items() if not r.get("error")}
+        print(f"Resuming {journal_file}: {len(done_results)} results already done")
+    else:
+        if journal is not None and journal.path.exists():
+            print(f"ERROR: Journal {journal_file} already exists. Pass --resume to continue it.")
+            sys.exit(1)
+
+        # Collect images
+        if dicom_dir:
+            images = collect_dicom_images(dicom_dir)
+            print(f"Found {len(images)} DICOM files in {dicom_dir}")
+            unlabelled = sum(1 for _, label in images if label == "UNKNOWN")
+            if unlabelled:
+                print(f"Warning: {unlabelled} files are not under a NORMAL or PNEUMONIA directory")
+        else:
+            images = collect_images(data_dir, split, manifest_cache_dir=manifest_cache_dir)
+            print(f"Found {len(images)} images in {split} set")
+
+        if not images:
+            print("ERROR: No images found. Check data directory structure.")
+            sys.exit(1)
+
+        # Sample if requested; seeded and stratified by label, so the same
+        # seed always selects the same images
+        if sample_size and sample_size < len(images):
+            entries = stratified_sample([{"path": p, "label": l} for p, l in images], sample_size, seed)
+            images = [(e["path"], e["label"]) for e in entries]
+            print(f"Sampled {sample_size} images (stratified, seed {seed})")
+
+    # Load skill prompts
+    variants = [dict(v) for v in variants or [{"name": MODEL, "model": MODEL, "prompt_file": str(SKILL_MD)}]]
+    for variant in variants:
+        variant["prompt"] = load_skill_prompt(variant["prompt_file"])
+        print(f"Loaded skill prompt {variant['prompt_file']} for {variant['model']} ({len(variant['prompt'])} chars)")
+    n_variants = len(variants)
+
+    if journal is not None:
+        header = None if resume else {
+            "timestamp": datetime.now().isoformat(),
+            "data_dir": data_dir or dicom_dir,
+            "split": split,
+            "seed": seed,
+            "images": images,
+            "variants": [{k: v[k] for k in ("name", "model", "prompt_file")} for v in variants],
+        }
+        journal.start(header)
+
+    # Run analysis. Jobs are numbered image-major (all variants of image 0,
+    # then image 1, ...) so each encoded image is reused while it is hot.
+    limiter = TokenBucket(rate=rpm / 60 if rpm else None, burst=concurrency)
+    cache = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, cache_max_bytes) if cache_max_bytes else ResponseCache(cache_dir)
+
+    def job(j):
+        img_path, label = images[j // n_variants]
+        return img_path, label, variants[j % n_variants]
+
+    # Results are slotted by job index so the report order does not depend
+    # on which request finishes first.
+    results = [done_results.get(j) for j in range(len(images) * n_variants)]
+    pending = [j for j in range(len(results)) if results[j] is None]
+    uses = {}
+    for j in pending:
+        uses[job(j)[0]] = uses.get(job(j)[0], 0) + 1
+    encoded = EncodedImages(uses, preprocessor)
+
+    def worker(j):
+        img_path, label, variant = job(j)
+        try:
+            image = encoded.get(img_path)
+        except Exception as e:
+            return failed_result(img_path, label, e)
+        try:
+            return evaluate_image(client, img_path, label, variant["prompt"], limiter, max_retries, cache,
+                                  prompt_cache, preprocessor, early_stop, keep_full_text, variant["model"], image)
+        finally:
+            encoded.release(img_path)
+
+    if batch:
+        print("Submitting images through the Message Batches API")
+    elif concurrency > 1:
+        print(f"Running with {concurrency} concurrent requests" + (f" at <= {rpm} requests/min" if rpm else ""))
+
+    run_started = time.perf_counter()
+    try:
+        if batch:
+            outcomes = run_batch_jobs(client, {j: job(j) for j in pending}, cache, journal, poll_interval,
+                                      prompt_cache=prompt_cache, images=encoded)
+        else:
+            outcomes = ((pending[k], outcome) for k, outcome in
+                        run_jobs(pending, worker, concurrency, warmup=n_variants if prompt_cache else 0))
+        for done, (j, (result, log)) in enumerate(outcomes, len(done_results) + 1):
+            name = variants[j % n_variants]["name"]
+            if n_variants > 1:
+                result["variant"] = name
+                log[0] += f" [{name}]"
+            print(f"\n[{done}/{len(results)}] " + "\n".join(log))
+            results[j] = result
+            if journal is not None:
+                journal.append(j, result)
+    finally:
+        if journal is not None:
+            journal.close()
+    wall_time = time.perf_counter() - run_started
+
+    # Calculate metrics per variant
+    new = set(pending)
+    summaries = []
+    for v, variant in enumerate(variants):
+        indices = range(v, len(results), n_variants)
+        summaries.append({
+            "name": variant["name"],
+            "model": variant["model"],
+            "prompt_file": variant["prompt_file"],
+            **summarize_variant([results[j] for j in indices], [results[j] for j in indices if j in new],
+                                wall_time, variant["model"], preprocessor, n_bootstrap, batch),
+        })
+
+    # Create report
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "data_dir": data_dir or dicom_dir,
+        "split": split,
+        "seed": seed,
+        "sample_size": len(images),
+    }
+    if n_variants == 1:
+        summary = summaries[0]
+        del summary["name"]
+        report.update(summary)
+    else:
+        report["variants"] = summaries
+        report["performance"] = summarize_performance([results[j] for j in pending], wall_time, len(pending))
+    report["results"] = results
+    if cache:
+        report["cache"] = cache.stats()
+
+    # Print summary
+    if n_variants == 1:
+        print_summary(report)
+    else:
+        print_comparison(report)
+
     # Save results
     if output_file:
         with open(output_file, "w") as f:
@@ -309,11 +1243,36 @@ def run_benchmark(
 
 def main():
     parser = argparse.ArgumentParser(description="Run CXR Pneumonia Detection Benchmark")
-    parser.add_argument("--data-dir", required=True, help="Path to chest_xray dataset")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data-dir", help="Path to chest_xray dataset")
+    source.add_argument("--dicom-dir", help="Evaluate DICOM files under NORMAL/ and PNEUMONIA/ subdirectories, converted in memory")
     parser.add_argument("--sample", type=int, help="Number of images to sample (for quick testing)")
     parser.add_argument("--full", action="store_true", help="Run on full test set")
     parser.add_argument("--split", default="test", choices=["train", "test", "val"], help="Dataset split")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the stratified sample (default: 0)")
+    parser.add_argument("--manifest-cache-dir", default=str(DEFAULT_MANIFEST_DIR), help=f"Dataset index cache (default: {DEFAULT_MANIFEST_DIR})")
     parser.add_argument("--output", help="Output JSON file for results")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of requests in flight at once (default: 1)")
+    parser.add_argument("--rpm", type=float, help="Maximum requests started per minute across all workers")
+    parser.add_argument("--max-retries", type=int, default=6, help="Retries per image on 429/529 and transient errors")
+    parser.add_argument("--journal", help="JSONL journal of completed results (default: output file with .jsonl suffix)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its journal")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Response cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="Evict least-recently-used responses beyond this size (default: 512)")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API and don't store responses")
+    parser.add_argument("--batch", action="store_true", help="Submit images through the Message Batches API (slower turnaround, half price)")
+    parser.add_argument("--poll-interval", type=float, default=30, help="Seconds between batch status checks (default: 30)")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="Don't mark the SKILL.md system prompt as a cacheable prefix")
+    parser.add_argument("--early-stop", action="store_true", help="Stop reading each response once the Pneumonia and Confidence lines are parsed")
+    parser.add_argument("--keep-full-text", action="store_true", help="With --early-stop, read responses to the end but still record time to verdict")
+    parser.add_argument("--variant", action="append", metavar="MODEL[=PROMPT_FILE]",
+                        help=f"Model/prompt combination to evaluate; repeat to compare several (default: {MODEL} with SKILL.md)")
+    parser.add_argument("--bootstrap", type=int, default=2000, help="Bootstrap resamples for metric CIs (default: 2000, 0 to skip)")
+    parser.add_argument("--preprocess", action="store_true", help="Downsize and re-encode images as grayscale JPEG before upload")
+    parser.add_argument("--max-edge", type=int, default=DEFAULT_MAX_EDGE, help=f"Longest image side after pre-processing (default: {DEFAULT_MAX_EDGE})")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_QUALITY, help=f"JPEG quality for pre-processed images (default: {DEFAULT_QUALITY})")
+    parser.add_argument("--clahe", action="store_true", help="Apply CLAHE contrast enhancement when pre-processing (requires opencv)")
+    parser.add_argument("--image-cache-dir", default=str(DEFAULT_IMAGE_CACHE_DIR), help=f"Pre-processed image cache (default: {DEFAULT_IMAGE_CACHE_DIR})")
 
     args = parser.parse_args()
 
@@ -323,13 +1282,48 @@ def main():
 
     sample_size = None if args.full else (args.sample or 20)
 
+    preprocessor = None
+    if args.preprocess or args.clahe:
+        preprocessor = Preprocessor(
+            max_edge=args.max_edge,
+            quality=args.jpeg_quality,
+            clahe=args.clahe,
+            cache_dir=args.image_cache_dir,
+        )
+
+    variants = None
+    if args.variant:
+        try:
+            variants = [parse_variant(spec, MODEL, SKILL_MD) for spec in args.variant]
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+
     output_file = args.output or f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
 
     run_benchmark(
         data_dir=args.data_dir,
+        dicom_dir=args.dicom_dir,
         sample_size=sample_size,
         split=args.split,
         output_file=output_file,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        max_retries=args.max_retries,
+        journal_file=args.journal,
+        resume=args.resume,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+        batch=args.batch,
+        poll_interval=args.poll_interval,
+        prompt_cache=not args.no_prompt_cache,
+        preprocessor=preprocessor,
+        early_stop=args.early_stop,
+        keep_full_text=args.keep_full_text,
+        n_bootstrap=args.bootstrap,
+        seed=args.seed,
+        manifest_cache_dir=args.manifest_cache_dir,
+        variants=variants,
     )
 
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark variants and cost estimates.
+
+A variant is one (model, prompt file) combination to evaluate. Variants are
+given on the command line as:
+    MODEL                 model with the default SKILL.md prompt
+    MODEL=PROMPT_FILE     model with another prompt revision
+    =PROMPT_FILE          default model with another prompt revision
+"""
+
+from pathlib import Path
+
+# USD per million tokens (input, output). Prompt cache writes cost 1.25x the
+# input price and reads 0.1x; batch requests are half price. Models are
+# matched by longest prefix so dated snapshots resolve to their family.
+PRICING = {
+    "claude-opus-4-5": (5.00, 25.00),
+    "claude-opus-4-1": (15.00, 75.00),
+    "claude-opus-4": (15.00, 75.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-haiku-4-5": (1.00, 5.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+BATCH_DISCOUNT = 0.5
+
+
+def parse_variant(spec: str, default_model: str, default_prompt_file: Path) -> dict:
+    """Parse a MODEL[=PROMPT_FILE] spec into a variant dict (name, model, prompt_file)."""
+    model, _, prompt_file = spec.partition("=")
+    model = model or default_model
+    prompt_file = Path(prompt_file) if prompt_file else Path(default_prompt_file)
+    if not prompt_file.exists():
+        raise ValueError(f"Prompt file not found: {prompt_file}")
+    return {"name": spec, "model": model, "prompt_file": str(prompt_file)}
+
+
+def model_pricing(model: str) -> tuple[float, float] | None:
+    """(input, output) USD per million tokens for `model`, or None if unknown."""
+    matches = [prefix for prefix in PRICING if model.startswith(prefix)]
+    if not matches:
+        return None
+    return PRICING[max(matches, key=len)]
+
+
+def estimate_cost(usage: dict, model: str, batch: bool = False) -> float | None:
+    """Estimated USD cost of a run's token usage (see summarize_usage()), or None for unpriced models."""
+    pricing = model_pricing(model)
+    if pricing is None:
+        return None
+    input_price, output_price = pricing
+    cost = (
+        usage["input_tokens"] * input_price
+        + usage["cache_creation_input_tokens"] * input_price * CACHE_WRITE_MULTIPLIER
+        + usage["cache_read_input_tokens"] * input_price * CACHE_READ_MULTIPLIER
+        + usage["output_tokens"] * output_price
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+DICOM Conversion Benchmarks
+
+Measures the stages of dicom_to_png.py:
+- windowing: the float64 path (astype(float) + rescale + apply_windowing())
+  against the lookup-table path (window_lut() + apply_lut()), reporting time
+  per image, peak traced memory and whether the outputs are identical
+- encoding: time and bytes per image for each output format and setting
+- auto-window: the original np.median + np.percentile window on the rescaled
+  float image against histogram_percentiles() on the stored values,
+  checking that both give the same window
+
+Usage:
+    python scripts/benchmark_dicom.py                        # synthetic 3000x3000 radiographs
+    python scripts/benchmark_dicom.py /path/to/dicoms/ --repeat 10
+    python scripts/benchmark_dicom.py image1.dcm image2.dcm
+    python scripts/benchmark_dicom.py --only encoding --max-edge 1568
+    python scripts/benchmark_dicom.py --only auto-window
+
+Requirements:
+    pip install pydicom pillow numpy
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import pydicom
+    import numpy as np
+except ImportError as e:
+    print(f"Missing dependency: {e}")
+    print("Install with: pip install pydicom pillow numpy")
+    sys.exit(1)
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dicom_to_png import (
+    ImageEncoder,
+    apply_lut,
+    apply_windowing,
+    auto_window_stats,
+    find_dicom_files,
+    get_window,
+    window_lut,
+)
+
+# (label, encoder arguments) for the encoding benchmark
+ENCODERS = [
+    ("png-rgb (legacy)", {"output_format": "png-rgb"}),
+    ("png level 1", {"output_format": "png", "compress_level": 1}),
+    ("png level 6", {"output_format": "png", "compress_level": 6}),
+    ("png level 9", {"output_format": "png", "compress_level": 9}),
+    ("png16 level 6", {"output_format": "png16", "compress_level": 6}),
+    ("jpeg q90", {"output_format": "jpeg", "quality": 90}),
+    ("jpeg q75", {"output_format": "jpeg", "quality": 75}),
+    ("webp q90", {"output_format": "webp", "quality": 90}),
+]
+
+
+def synthetic_cases(size: int = 3000) -> list:
+    """Synthetic CR-like images: 12-bit unsigned, and signed with a CT-style intercept."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:size, 0:size]
+    base = np.clip((np.sin(xx / 97.0) + np.cos(yy / 61.0)) * 0.25 + 0.5 + rng.normal(0, 0.05, (size, size)), 0, 1)
+    return [
+        {
+            "name": f"uint16 {size}x{size}",
+            "pixels": (base * 4095).astype(np.uint16),
+            "slope": 1.0, "intercept": 0.0, "center": 2048, "width": 3000, "invert": False,
+        },
+        {
+            "name": f"int16 {size}x{size} MONOCHROME1",
+            "pixels": (base * 4095 - 2048).astype(np.int16),
+            "slope": 1.0, "intercept": -1024.0, "center": -600, "width": 1500, "invert": True,
+        },
+    ]
+
+
+def dicom_cases(paths: list) -> list:
+    """Benchmark cases from DICOM files, windowed as the "auto" preset would."""
+    cases = []
+    for path in paths:
+        ds = pydicom.dcmread(path)
+        pixels = ds.pixel_array
+        if hasattr(ds, "RescaleSlope") and hasattr(ds, "RescaleIntercept"):
+            slope, intercept = ds.RescaleSlope, ds.RescaleIntercept
+        else:
+            slope, intercept = 1.0, 0.0
+        center, width = get_window(ds, pixels, slope, intercept, "auto")
+        cases.append({
+            "name": Path(path).name,
+            "pixels": pixels,
+            "slope": slope, "intercept": intercept, "center": center, "width": width,
+            "invert": getattr(ds, "PhotometricInterpretation", None) == "MONOCHROME1",
+        })
+    return cases
+
+
+def float_path(case: dict) -> np.ndarray:
+    """Windowing as convert_dicom_to_png() did it before the lookup-table engine."""
+    pixels = case["pixels"].astype(float) * case["slope"] + case["intercept"]
+    normalized = apply_windowing(pixels, case["center"], case["width"])
+    if case["invert"]:
+        normalized = 255 - normalized
+    return normalized
+
+
+def lut_path(case: dict, dtype: np.dtype = np.uint8) -> np.ndarray:
+    """Windowing through a lookup table on the stored integer values."""
+    lut = window_lut(case["pixels"].dtype, case["slope"], case["intercept"],
+                     case["center"], case["width"], case["invert"], dtype)
+    return apply_lut(case["pixels"], lut)
+
+
+def measure(fn, case: dict, repeat: int) -> dict:
+    """Best-of-`repeat` wall time and peak traced allocation of one call."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(case)
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    output = fn(case)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time_s": min(times), "peak_bytes": peak, "output": output}
+
+
+def benchmark_windowing(cases: list, repeat: int) -> None:
+    print(f"{'Image':<36} {'float ms':>9} {'LUT ms':>8} {'speedup':>8} {'float MB':>9} {'LUT MB':>8}  identical")
+    for case in cases:
+        old = measure(float_path, case, repeat)
+        new = measure(lut_path, case, repeat)
+        identical = np.array_equal(old["output"], new["output"])
+        print(f"{case['name'][:36]:<36} {old['time_s'] * 1e3:>9.1f} {new['time_s'] * 1e3:>8.1f} "
+              f"{old['time_s'] / new['time_s']:>7.1f}x {old['peak_bytes'] / 1e6:>9.1f} "
+              f"{new['peak_bytes'] / 1e6:>8.1f}  {'yes' if identical else 'NO'}")
+
+
+def benchmark_encoding(cases: list, repeat: int, max_edge: int = None) -> None:
+    """Mean best-of-`repeat` encode time and mean encoded size per image for each encoder."""
+    frames = {np.dtype(np.uint8): [lut_path(case) for case in cases],
+              np.dtype(np.uint16): [lut_path(case, np.uint16) for case in cases]}
+    print(f"{'Encoder':<20} {'ms/image':>9} {'KB/image':>9}")
+    for label, kwargs in ENCODERS:
+        encoder = ImageEncoder(max_edge=max_edge, **kwargs)
+        times, sizes = [], []
+        for frame in frames[np.dtype(encoder.dtype)]:
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = encoder.encode(frame)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            times.append(best)
+            sizes.append(len(data))
+        print(f"{label:<20} {np.mean(times) * 1e3:>9.1f} {np.mean(sizes) / 1e3:>9.1f}")
+
+
+def percentile_window(case: dict) -> tuple:
+    """The original "auto" window: median and 1st/99th percentiles of the rescaled float image."""
+    pixels = case["pixels"].astype(float) * case["slope"] + case["intercept"]
+    center = np.median(pixels)
+    width = np.percentile(pixels, 99) - np.percentile(pixels, 1)
+    return center, width
+
+
+def histogram_window(case: dict, roi: bool = False) -> tuple:
+    """The "auto" (or "auto-roi") window from one histogram of the stored values."""
+    low, median, high = auto_window_stats(case["pixels"], roi)
+    return median * case["slope"] + case["intercept"], (high - low) * abs(case["slope"])
+
+
+def benchmark_auto_window(cases: list, repeat: int) -> None:
+    print(f"{'Image':<36} {'pctl ms':>8} {'hist ms':>8} {'speedup':>8}  {'window (center/width)':<24} equivalent  {'roi window':<18}")
+    for case in cases:
+        old = measure(percentile_window, case, repeat)
+        new = measure(histogram_window, case, repeat)
+        (old_center, old_width), (center, width) = old["output"], new["output"]
+        # The original statistics are taken after rescaling, so allow for float rounding
+        equivalent = np.allclose([old_center, old_width], [center, width], rtol=1e-9, atol=1e-9)
+        roi_center, roi_width = histogram_window(case, roi=True)
+        print(f"{case['name'][:36]:<36} {old['time_s'] * 1e3:>8.1f} {new['time_s'] * 1e3:>8.1f} "
+              f"{old['time_s'] / new['time_s']:>7.1f}x  {f'{center:.1f} / {width:.1f}':<24} "
+              f"{'yes' if equivalent else 'NO':<10}  {f'{roi_center:.1f} / {roi_width:.1f}':<18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DICOM windowing engines and output encoders")
+    parser.add_argument("inputs", nargs="*", help="DICOM files or directories (default: synthetic images)")
+    parser.add_argument("--size", type=int, default=3000, help="Synthetic image size (default: 3000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per engine (default: 5)")
+    parser.add_argument("--only", choices=["windowing", "encoding", "auto-window"], help="Run one benchmark only")
+    parser.add_argument("--max-edge", type=int, help="Downscale before encoding (encoding benchmark)")
+    args = parser.parse_args()
+
+    if args.inputs:
+        paths = []
+        for item in args.inputs:
+            paths.extend(find_dicom_files(item) if Path(item).is_dir() else [Path(item)])
+        cases = dicom_cases(paths)
+    else:
+        cases = synthetic_cases(args.size)
+
+    if args.only in (None, "windowing"):
+        print("Windowing")
+        benchmark_windowing(cases, args.repeat)
+    if args.only in (None, "encoding"):
+        print("\nEncoding" + (f" (downscaled to {args.max_edge}px)" if args.max_edge else ""))
+        benchmark_encoding(cases, args.repeat, args.max_edge)
+    if args.only in (None, "auto-window"):
+        print("\nAuto window")
+        benchmark_auto_window(cases, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,47 @@ DICOM to PNG Converter for Chest X-Ray Analysis
 Converts DICOM medical imaging files to PNG format for analysis.
 Handles windowing and normalization for optimal chest X-ray viewing.
 
+Output formats (--format):
+    png       8-bit grayscale PNG (default)
+    png-rgb   8-bit RGB PNG, for viewers that expect color images
+    png16     16-bit grayscale PNG, windowed at full 16-bit resolution
+    jpeg      JPEG at --quality
+    webp      WebP at --quality
+
 Usage:
     python scripts/dicom_to_png.py input.dcm output.png
     python scripts/dicom_to_png.py input.dcm output.png --window chest
+    python scripts/dicom_to_png.py input.dcm output.png --window chest mediastinum bone
+    python scripts/dicom_to_png.py input.dcm output.jpg --format jpeg --quality 90 --max-edge 1568
     python scripts/dicom_to_png.py /path/to/dicoms/ /path/to/output/ --batch
+    python scripts/dicom_to_png.py /path/to/dicoms/ /path/to/output/ --batch --workers 8
+    python scripts/dicom_to_png.py /path/to/dicoms/ /path/to/output/ --batch --incremental
+
+Header index (no pixel decoding):
+    python scripts/dicom_to_png.py index /path/to/dicoms/ archive.sqlite --workers 8
+    python scripts/dicom_to_png.py select archive.sqlite --modality CR DX --view PA --min-width 2000
+    python scripts/dicom_to_png.py select archive.sqlite --where "study_date >= '20240101'" --count
+
+Streaming (no intermediate files):
+    from dicom_to_png import stream_dicom
+    for path, data, error in stream_dicom(find_dicom_files("/path/to/dicoms"), workers=4):
+        ...  # data is the encoded image (PNG by default), ready to base64 for a request
 
 Requirements:
     pip install pydicom pillow numpy
 """
 
 import argparse
+import hashlib
+import io
+import json
+import os
+import queue
+import sqlite3
 import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 try:
@@ -34,48 +64,175 @@ WINDOW_PRESETS = {
     "mediastinum": {"center": 40, "width": 400},  # Soft tissue
     "bone": {"center": 400, "width": 1800},  # Bone detail
     "auto": None,  # Use DICOM metadata or auto-calculate
+    "auto-roi": None,  # Auto-calculate inside the collimated field, ignoring DICOM metadata
+}
+
+# Fraction of each edge left out of the "auto-roi" statistics, where
+# collimator shadows, labels and detector borders usually sit
+AUTO_ROI_BORDER = 0.05
+
+# DICOM Part 10 files start with a 128-byte preamble followed by "DICM"
+DICOM_PREAMBLE_LENGTH = 128
+DICOM_MAGIC = b"DICM"
+DICOM_EXTENSIONS = {".dcm", ".dicom"}
+
+# Incremental batch conversion keeps a record of converted inputs here,
+# inside the output directory
+CONVERSION_MANIFEST = ".dicom_to_png_manifest.json"
+CONVERSION_MANIFEST_VERSION = 1
+
+# Output encoders: file extension and pixel type of the windowed data
+OUTPUT_FORMATS = {
+    "png": {"extension": ".png", "dtype": np.uint8},
+    "png-rgb": {"extension": ".png", "dtype": np.uint8},
+    "png16": {"extension": ".png", "dtype": np.uint16},
+    "jpeg": {"extension": ".jpg", "dtype": np.uint8},
+    "webp": {"extension": ".webp", "dtype": np.uint8},
 }
 
 
-def apply_windowing(pixel_array: np.ndarray, center: float, width: float) -> np.ndarray:
-    """Apply window/level transformation to pixel data."""
+def apply_windowing(
+    pixel_array: np.ndarray,
+    center: float,
+    width: float,
+    dtype: np.dtype = np.uint8,
+) -> np.ndarray:
+    """Apply window/level transformation to pixel data, scaled to the full range of `dtype`."""
     min_val = center - width / 2
     max_val = center + width / 2
 
     windowed = np.clip(pixel_array, min_val, max_val)
-    normalized = ((windowed - min_val) / (max_val - min_val) * 255).astype(np.uint8)
+    normalized = ((windowed - min_val) / (max_val - min_val) * np.iinfo(dtype).max).astype(dtype)
 
     return normalized
 
 
-def convert_dicom_to_png(
-    dicom_path: str,
-    output_path: str,
-    window_preset: str = "auto"
-) -> str:
+def window_lut(
+    dtype: np.dtype,
+    slope: float,
+    intercept: float,
+    center: float,
+    width: float,
+    invert: bool = False,
+    out_dtype: np.dtype = np.uint8,
+) -> np.ndarray:
     """
-    Convert a DICOM file to PNG.
+    Build a lookup table covering every stored value of an 8- or 16-bit integer dtype.
 
-    Args:
-        dicom_path: Path to input DICOM file
-        output_path: Path for output PNG file
-        window_preset: Window preset name or "auto"
+    Entry i holds the output for the stored value whose bit pattern is i, after
+    rescale, windowing and optional MONOCHROME1 inversion. The float math is
+    the same as apply_windowing() on a rescaled float array, so the results
+    match exactly; it just runs on 65,536 values instead of every pixel.
+    """
+    dtype = np.dtype(dtype)
+    values = np.arange(1 << (8 * dtype.itemsize), dtype=f"u{dtype.itemsize}").view(dtype).astype(float)
+    lut = apply_windowing(values * slope + intercept, center, width, out_dtype)
+    if invert:
+        lut = np.iinfo(out_dtype).max - lut
+    return lut
 
-    Returns:
-        Path to output file
+
+def apply_lut(pixel_array: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Window an integer pixel array with a single gather through a window_lut() table."""
+    return lut[pixel_array.view(f"u{pixel_array.dtype.itemsize}")]
+
+
+def supports_lut(pixel_array: np.ndarray) -> bool:
+    """Whether a pixel array can be windowed through a lookup table (native 8/16-bit integers)."""
+    dtype = pixel_array.dtype
+    return dtype.kind in "iu" and dtype.itemsize <= 2 and dtype.isnative
+
+
+def _lerp(a: np.ndarray, b: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Linear interpolation computed the same way as np.percentile, so results match it exactly."""
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def histogram_percentiles(pixel_array: np.ndarray, percentiles: list, exclude_extremes: bool = False) -> np.ndarray:
     """
-    # Read DICOM
-    ds = pydicom.dcmread(dicom_path)
-    pixel_array = ds.pixel_array.astype(float)
+    Percentiles of 8/16-bit integer pixel data from a single histogram.
+
+    One np.bincount over the stored values replaces the sorts/partitions of
+    np.median and np.percentile; ranks are then looked up in the cumulative
+    counts and interpolated as np.percentile's default (linear) method does,
+    so the results are identical to it.
+
+    With `exclude_extremes`, pixels at the lowest and highest stored value
+    are ignored. Collimator shadows, padding and burned-out background
+    usually saturate at one of them.
+    """
+    dtype = pixel_array.dtype
+    bits = 8 * dtype.itemsize
+    index = pixel_array.view(f"u{dtype.itemsize}")
+    offset = 0
+    if dtype.kind == "i":
+        # Flip the sign bit so bin order matches value order
+        index = index ^ index.dtype.type(1 << (bits - 1))
+        offset = -(1 << (bits - 1))
+    counts = np.bincount(index.ravel(), minlength=1 << bits)
+
+    if exclude_extremes:
+        occupied = np.flatnonzero(counts)
+        if len(occupied) > 2:
+            counts[occupied[0]] = 0
+            counts[occupied[-1]] = 0
+
+    cumulative = np.cumsum(counts)
+    n = int(cumulative[-1])
+    ranks = (n - 1) * (np.asarray(percentiles, dtype=float) / 100)
+    below = np.floor(ranks)
+    lower = below.astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    a = (np.searchsorted(cumulative, lower, side="right") + offset).astype(float)
+    b = (np.searchsorted(cumulative, upper, side="right") + offset).astype(float)
+    return _lerp(a, b, ranks - below)
+
+
+def auto_window_stats(pixel_array: np.ndarray, roi: bool = False, samples: int = 1) -> np.ndarray:
+    """
+    1st percentile, median and 99th percentile of the stored pixel values.
+
+    With `roi`, an AUTO_ROI_BORDER margin of every edge is left out and the
+    extreme stored values are ignored (see histogram_percentiles()).
+    `samples` is the SamplesPerPixel of the data, to find the row and
+    column axes.
+    """
+    if roi:
+        row_axis = pixel_array.ndim - (3 if samples > 1 else 2)
+        crop = [slice(None)] * pixel_array.ndim
+        for axis in (row_axis, row_axis + 1):
+            margin = int(pixel_array.shape[axis] * AUTO_ROI_BORDER)
+            crop[axis] = slice(margin, pixel_array.shape[axis] - margin)
+        pixel_array = pixel_array[tuple(crop)]
+
+    if supports_lut(pixel_array):
+        return histogram_percentiles(pixel_array, [1, 50, 99], exclude_extremes=roi)
+
+    values = pixel_array.ravel()
+    if roi:
+        inside = values[(values > values.min()) & (values < values.max())]
+        values = inside if inside.size else values
+    return np.percentile(values, [1, 50, 99])
 
-    # Apply rescale if present (convert to Hounsfield units for CT, or just rescale)
-    if hasattr(ds, 'RescaleSlope') and hasattr(ds, 'RescaleIntercept'):
-        pixel_array = pixel_array * ds.RescaleSlope + ds.RescaleIntercept
 
-    # Determine windowing
-    if window_preset == "auto":
+def get_window(
+    ds: pydicom.Dataset,
+    pixel_array: np.ndarray,
+    slope: float,
+    intercept: float,
+    window_preset: str,
+) -> tuple:
+    """
+    Resolve the (center, width) window for a preset.
+
+    "auto" uses the DICOM window tags when present and otherwise derives the
+    window from the stored pixel statistics mapped through the rescale.
+    "auto-roi" always derives it from the pixels, inside the collimated field.
+    """
+    if window_preset in ("auto", "auto-roi"):
         # Try to get from DICOM metadata
-        if hasattr(ds, 'WindowCenter') and hasattr(ds, 'WindowWidth'):
+        if window_preset == "auto" and hasattr(ds, 'WindowCenter') and hasattr(ds, 'WindowWidth'):
             center = ds.WindowCenter
             width = ds.WindowWidth
             # Handle multi-valued windows (take first)
@@ -83,109 +240,859 @@ def convert_dicom_to_png(
                 center = center[0]
             if isinstance(width, pydicom.multival.MultiValue):
                 width = width[0]
-        else:
-            # Auto-calculate from pixel data
-            center = np.median(pixel_array)
-            width = np.percentile(pixel_array, 99) - np.percentile(pixel_array, 1)
+            return center, width
+
+        # Auto-calculate from pixel data. Rescale is linear, so statistics of
+        # the stored values map straight to rescaled units without building
+        # a rescaled copy of the image.
+        samples = int(getattr(ds, 'SamplesPerPixel', 1) or 1)
+        low, median, high = auto_window_stats(pixel_array, window_preset == "auto-roi", samples)
+        return median * slope + intercept, (high - low) * abs(slope)
+
+    preset = WINDOW_PRESETS.get(window_preset)
+    if preset is None:
+        raise ValueError(f"Unknown window preset: {window_preset}")
+    return preset["center"], preset["width"]
+
+
+def is_dicom_file(path: str) -> bool:
+    """Check for the DICM magic after the preamble, reading only the first 132 bytes."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(DICOM_PREAMBLE_LENGTH)
+            return f.read(len(DICOM_MAGIC)) == DICOM_MAGIC
+    except OSError:
+        return False
+
+
+def find_dicom_files(input_dir: str, recursive: bool = True) -> list:
+    """
+    Find DICOM files under a directory in a single pass.
+
+    Files with a .dcm/.dicom extension are taken as-is; any other file is
+    included if it has the DICOM preamble and magic, which covers the
+    extension-less and UID-named files PACS exports produce without parsing
+    any headers.
+
+    Args:
+        input_dir: Directory to search
+        recursive: Descend into subdirectories
+
+    Returns:
+        Sorted list of paths
+    """
+    found = []
+    pending = [input_dir]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.is_file():
+                    path = Path(entry.path)
+                    if path.suffix.lower() in DICOM_EXTENSIONS or is_dicom_file(entry.path):
+                        found.append(path)
+    return sorted(found)
+
+
+def output_stem(dicom_file: Path) -> str:
+    """Output base name for a DICOM file: the .dcm/.dicom extension is dropped, anything else is kept."""
+    if dicom_file.suffix.lower() in DICOM_EXTENSIONS:
+        return dicom_file.stem
+    return dicom_file.name
+
+
+def output_filename(
+    stem: str,
+    frame: int,
+    preset: str,
+    n_frames: int,
+    n_presets: int,
+    extension: str = ".png",
+) -> str:
+    """
+    File name for one exported view: {stem}_f{frame:03d}_{preset}{extension}.
+
+    The frame part is left out for single-frame images and the preset part
+    when only one preset is exported, so the default export is {stem}.png.
+    """
+    name = stem
+    if n_frames > 1:
+        name += f"_f{frame:03d}"
+    if n_presets > 1:
+        name += f"_{preset}"
+    return f"{name}{extension}"
+
+
+def read_frames(ds: pydicom.Dataset) -> np.ndarray:
+    """Decode the pixel data as a (frames, rows, columns[, samples]) array."""
+    pixel_array = ds.pixel_array
+    if int(getattr(ds, 'NumberOfFrames', 1) or 1) > 1:
+        return pixel_array
+    return pixel_array[np.newaxis]
+
+
+def render_window(
+    ds: pydicom.Dataset,
+    pixel_array: np.ndarray,
+    window_preset: str = "auto",
+    dtype: np.dtype = np.uint8,
+) -> np.ndarray:
+    """
+    Rescale, window and invert decoded pixel data into an array of the same shape.
+
+    Args:
+        ds: Dataset the pixels came from (rescale, window and photometric tags)
+        pixel_array: Decoded pixel data, any number of frames
+        window_preset: Window preset name or "auto"
+        dtype: Output type (uint8, or uint16 for 16-bit output)
+
+    Returns:
+        Array of `dtype`
+    """
+    # Rescale if present (convert to Hounsfield units for CT, or just rescale)
+    if hasattr(ds, 'RescaleSlope') and hasattr(ds, 'RescaleIntercept'):
+        slope, intercept = ds.RescaleSlope, ds.RescaleIntercept
     else:
-        preset = WINDOW_PRESETS.get(window_preset)
-        if preset is None:
-            raise ValueError(f"Unknown window preset: {window_preset}")
-        center = preset["center"]
-        width = preset["width"]
+        slope, intercept = 1.0, 0.0
 
-    # Apply windowing
-    normalized = apply_windowing(pixel_array, center, width)
+    center, width = get_window(ds, pixel_array, slope, intercept, window_preset)
 
     # Handle photometric interpretation (invert if needed)
-    if hasattr(ds, 'PhotometricInterpretation'):
-        if ds.PhotometricInterpretation == "MONOCHROME1":
-            normalized = 255 - normalized
+    invert = getattr(ds, 'PhotometricInterpretation', None) == "MONOCHROME1"
+
+    # Apply rescale + windowing + inversion. Integer data goes through a
+    # lookup table on the stored values, avoiding full-size float64 copies.
+    if supports_lut(pixel_array):
+        lut = window_lut(pixel_array.dtype, slope, intercept, center, width, invert, dtype)
+        return apply_lut(pixel_array, lut)
+
+    normalized = apply_windowing(pixel_array.astype(float) * slope + intercept, center, width, dtype)
+    if invert:
+        normalized = np.iinfo(dtype).max - normalized
+    return normalized
+
+
+class ImageEncoder:
+    """
+    Encoder for windowed frames.
+
+    Args:
+        output_format: One of OUTPUT_FORMATS
+        compress_level: zlib level for PNG formats (0-9; lower is faster, higher is smaller)
+        quality: Quality for JPEG and WebP (1-100)
+        max_edge: Downscale so the longest side is at most this many pixels (None keeps the size)
+    """
+
+    def __init__(
+        self,
+        output_format: str = "png",
+        compress_level: int = 6,
+        quality: int = 90,
+        max_edge: int = None,
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_format = output_format
+        self.compress_level = compress_level
+        self.quality = quality
+        self.max_edge = max_edge
 
-    # Create and save image
-    image = Image.fromarray(normalized)
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS[self.output_format]["extension"]
 
-    # Convert to RGB if grayscale (some viewers expect this)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    @property
+    def dtype(self) -> np.dtype:
+        """Pixel type render_window() should produce for this format."""
+        return OUTPUT_FORMATS[self.output_format]["dtype"]
 
-    image.save(output_path)
+    def settings(self) -> dict:
+        """Settings that determine the encoded output."""
+        return {
+            "format": self.output_format,
+            "compress_level": self.compress_level,
+            "quality": self.quality,
+            "max_edge": self.max_edge,
+        }
 
-    return output_path
+    def encode(self, normalized: np.ndarray) -> bytes:
+        """Encode one windowed frame and return the file bytes."""
+        image = Image.fromarray(normalized)
 
+        if self.max_edge and max(image.size) > self.max_edge:
+            scale = self.max_edge / max(image.size)
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+
+        buf = io.BytesIO()
+        if self.output_format == "png-rgb":
+            # Some viewers expect color images
+            image.convert("RGB").save(buf, format="PNG", compress_level=self.compress_level)
+        elif self.output_format in ("png", "png16"):
+            image.save(buf, format="PNG", compress_level=self.compress_level)
+        elif self.output_format == "jpeg":
+            image.save(buf, format="JPEG", quality=self.quality)
+        else:
+            image.save(buf, format="WEBP", quality=self.quality)
+        return buf.getvalue()
 
-def batch_convert(input_dir: str, output_dir: str, window_preset: str = "auto") -> list:
+    def save(self, normalized: np.ndarray, output_path: str) -> str:
+        """Encode one windowed frame to `output_path`."""
+        Path(output_path).write_bytes(self.encode(normalized))
+        return output_path
+
+
+def convert_dicom_to_png(
+    dicom_path: str | pydicom.Dataset,
+    output_path: str,
+    window_preset: str = "auto",
+    encoder: ImageEncoder = None,
+) -> str:
     """
-    Convert all DICOM files in a directory.
+    Convert a DICOM file to PNG.
+
+    Multi-frame images are written as their first frame; use export_dicom()
+    to write every frame.
 
     Args:
-        input_dir: Directory containing DICOM files
+        dicom_path: Path to input DICOM file, or an already-read dataset
+        output_path: Path for output PNG file
+        window_preset: Window preset name or "auto"
+        encoder: Output encoder (default: 8-bit grayscale PNG)
+
+    Returns:
+        Path to output file
+    """
+    encoder = encoder or ImageEncoder()
+
+    # Read DICOM
+    ds = dicom_path if isinstance(dicom_path, pydicom.Dataset) else pydicom.dcmread(dicom_path)
+    frames = read_frames(ds)
+
+    return encoder.save(render_window(ds, frames[0], window_preset, encoder.dtype), output_path)
+
+
+def export_dicom(
+    dicom_path: str | pydicom.Dataset,
+    output_dir: str,
+    stem: str,
+    window_presets: list = ("auto",),
+    encoder: ImageEncoder = None,
+    extension: str = None,
+) -> list:
+    """
+    Decode a DICOM file once and write every frame in every window preset.
+
+    Files are named by output_filename(), so a single-frame image exported
+    with one preset is written as {stem}{extension}, the same as
+    convert_dicom_to_png().
+
+    Args:
+        dicom_path: Path to input DICOM file, or an already-read dataset
         output_dir: Directory for output PNGs
-        window_preset: Window preset to use
+        stem: Base name for the outputs
+        window_presets: Window preset names to export
+        encoder: Output encoder (default: 8-bit grayscale PNG)
+        extension: Output file suffix (default: the encoder's, e.g. ".png")
 
     Returns:
         List of output file paths
     """
+    encoder = encoder or ImageEncoder()
+    extension = extension or encoder.extension
+    ds = dicom_path if isinstance(dicom_path, pydicom.Dataset) else pydicom.dcmread(dicom_path)
+    frames = read_frames(ds)
+
+    outputs = []
+    for preset in window_presets:
+        # One windowing pass over all frames per preset
+        normalized = render_window(ds, frames, preset, encoder.dtype)
+        for frame, image in enumerate(normalized):
+            filename = output_filename(stem, frame, preset, len(frames), len(window_presets), extension)
+            outputs.append(encoder.save(image, str(Path(output_dir) / filename)))
+    return outputs
+
+
+def render_dicom(
+    dicom_path: str | pydicom.Dataset,
+    window_preset: str = "auto",
+    frame: int = 0,
+    dtype: np.dtype = np.uint8,
+) -> np.ndarray:
+    """Decode one frame of a DICOM file and return it windowed, without writing anything."""
+    ds = dicom_path if isinstance(dicom_path, pydicom.Dataset) else pydicom.dcmread(dicom_path)
+    return render_window(ds, read_frames(ds)[frame], window_preset, dtype)
+
+
+def encode_dicom(
+    dicom_path: str | pydicom.Dataset,
+    window_preset: str = "auto",
+    encoder: ImageEncoder = None,
+    frame: int = 0,
+) -> bytes:
+    """Convert one frame of a DICOM file to encoded image bytes in memory."""
+    encoder = encoder or ImageEncoder()
+    return encoder.encode(render_dicom(dicom_path, window_preset, frame, encoder.dtype))
+
+
+def stream_dicom(
+    paths,
+    window_preset: str = "auto",
+    encoder: ImageEncoder = None,
+    workers: int = 1,
+    queue_size: int = 8,
+):
+    """
+    Convert DICOM files to encoded image bytes on background threads.
+
+    Yields (path, data, error) as conversions finish, with data None and
+    error set for files that failed. At most `queue_size` converted images
+    wait in memory, so producers block while the consumer is busy (e.g.
+    waiting on API requests). Decoding, the LUT gather and zlib release the
+    GIL, so several `workers` overlap well. Closing the generator early
+    stops the workers after their current file.
+
+    Args:
+        paths: Iterable of DICOM file paths (consumed lazily)
+        window_preset: Window preset name or "auto"
+        encoder: Output encoder (default: 8-bit grayscale PNG)
+        workers: Conversion threads
+        queue_size: Maximum converted images buffered ahead of the consumer
+    """
+    encoder = encoder or ImageEncoder()
+    paths = iter(paths)
+    paths_lock = threading.Lock()
+    results = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        while not stop.is_set():
+            with paths_lock:
+                path = next(paths, None)
+            if path is None:
+                break
+            try:
+                put((str(path), encode_dicom(path, window_preset, encoder), None))
+            except Exception as e:
+                put((str(path), None, str(e)))
+        put(finished)
+
+    threads = [threading.Thread(target=produce, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = results.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_conversion_manifest(output_dir: str) -> dict:
+    """Entries of the incremental conversion manifest in `output_dir`, keyed by source path relative to the input directory."""
+    try:
+        with open(Path(output_dir) / CONVERSION_MANIFEST) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get("version") != CONVERSION_MANIFEST_VERSION:
+        return {}
+    return manifest["entries"]
+
+
+def save_conversion_manifest(output_dir: str, entries: dict) -> None:
+    """Atomically write the incremental conversion manifest."""
+    document = {"version": CONVERSION_MANIFEST_VERSION, "entries": entries}
+    fd, tmp = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(document, f, separators=(",", ":"))
+    os.replace(tmp, Path(output_dir) / CONVERSION_MANIFEST)
+
+
+def conversion_settings(window_presets: list, encoder: ImageEncoder) -> dict:
+    """Settings that determine a file's outputs; a change forces re-conversion."""
+    return {"window_presets": list(window_presets), **encoder.settings()}
+
+
+def is_converted(entry: dict, dicom_file: Path, st: os.stat_result, settings: dict, output_dir: Path) -> bool:
+    """
+    Whether a manifest entry still describes `dicom_file` converted with `settings`.
+
+    Unchanged size and mtime are trusted; if only the mtime moved (e.g. the
+    file was copied again), the content hash decides. The entry's stat fields
+    are refreshed in that case.
+    """
+    if entry.get("settings") != settings:
+        return False
+    if not all((output_dir / output).exists() for output in entry["outputs"]):
+        return False
+    if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return True
+    if entry["size"] != st.st_size or file_sha256(dicom_file) != entry["sha256"]:
+        return False
+    entry["mtime_ns"] = st.st_mtime_ns
+    return True
+
+
+def _convert_task(task: tuple) -> tuple:
+    """
+    Export one (dicom_path, output_dir, stem, window_presets, encoder, record) task.
+
+    Returns (outputs, error message or None, record). With `record`, the file
+    is read once into memory so its hash and SOPInstanceUID can be returned
+    for the conversion manifest without a second read.
+    """
+    dicom_path, output_dir, stem, window_presets, encoder, record = task
+    try:
+        if not record:
+            return export_dicom(dicom_path, output_dir, stem, window_presets, encoder), None, None
+        data = Path(dicom_path).read_bytes()
+        ds = pydicom.dcmread(io.BytesIO(data))
+        outputs = export_dicom(ds, output_dir, stem, window_presets, encoder)
+        details = {
+            "sop_instance_uid": str(ds.get("SOPInstanceUID", "")),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+        return outputs, None, details
+    except Exception as e:
+        return [], str(e), None
+
+
+def batch_convert(
+    input_dir: str,
+    output_dir: str,
+    window_preset: str | list = "auto",
+    workers: int = 1,
+    chunksize: int = None,
+    incremental: bool = False,
+    encoder: ImageEncoder = None,
+) -> list:
+    """
+    Convert all DICOM files in a directory tree.
+
+    Files in subdirectories are written to the same relative location under
+    `output_dir`. Each file is decoded once and written for every frame and
+    window preset (see export_dicom()).
+
+    Args:
+        input_dir: Directory containing DICOM files
+        output_dir: Directory for output PNGs
+        window_preset: Window preset to use, or a list of presets to export
+        workers: Number of worker processes (1 converts in this process)
+        chunksize: Files handed to a worker at a time (default: sized from the file count)
+        incremental: Skip files already converted with the same settings, as
+            recorded in the output directory's manifest (SOPInstanceUID,
+            source size/mtime/hash, settings, outputs)
+        encoder: Output encoder (default: 8-bit grayscale PNG)
+
+    Returns:
+        List of output file paths written by this run
+    """
+    window_presets = [window_preset] if isinstance(window_preset, str) else list(window_preset)
+    encoder = encoder or ImageEncoder()
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
     outputs = []
+    settings = conversion_settings(window_presets, encoder)
+    previous = load_conversion_manifest(output_path) if incremental else {}
+    manifest = {}
+    stats = {}
 
-    # Common DICOM extensions
-    dicom_patterns = ["*.dcm", "*.DCM", "*.dicom", "*.DICOM"]
+    # Discovery only sniffs file headers; each file is parsed once, by the
+    # conversion itself.
+    tasks = []
+    for dicom_file in find_dicom_files(input_dir):
+        source = dicom_file.relative_to(input_path).as_posix()
+        if incremental:
+            st = stats[source] = dicom_file.stat()
+            entry = previous.get(source)
+            if entry is not None and is_converted(entry, dicom_file, st, settings, output_path):
+                manifest[source] = entry
+                continue
+        file_output_dir = output_path / dicom_file.parent.relative_to(input_path)
+        file_output_dir.mkdir(parents=True, exist_ok=True)
+        tasks.append((str(dicom_file), str(file_output_dir), output_stem(dicom_file), window_presets,
+                      encoder, incremental))
 
-    dicom_files = []
-    for pattern in dicom_patterns:
-        dicom_files.extend(input_path.glob(pattern))
+    if incremental:
+        print(f"{len(manifest)} files unchanged since the last run, {len(tasks)} to convert")
 
-    # Also check files without extension (common for DICOM)
-    for f in input_path.iterdir():
-        if f.is_file() and f.suffix == "":
-            try:
-                pydicom.dcmread(f, stop_before_pixels=True)
-                dicom_files.append(f)
-            except:
-                pass
-
-    for dicom_file in dicom_files:
-        output_file = output_path / f"{dicom_file.stem}.png"
-        try:
-            convert_dicom_to_png(str(dicom_file), str(output_file), window_preset)
-            outputs.append(str(output_file))
-            print(f"Converted: {dicom_file.name} -> {output_file.name}")
-        except Exception as e:
-            print(f"Error converting {dicom_file.name}: {e}")
+    # Each worker runs the same export_dicom() as the serial path, so
+    # outputs are byte-identical. Tasks are handed out in chunks to keep IPC
+    # overhead low, and results come back in input order.
+    if workers > 1 and len(tasks) > 1:
+        if chunksize is None:
+            chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_convert_task, tasks, chunksize=chunksize)
+    else:
+        pool = None
+        results = map(_convert_task, tasks)
+
+    failures = []
+    try:
+        for done, (task, (files, error, details)) in enumerate(zip(tasks, results), 1):
+            dicom_file = task[0]
+            name = Path(dicom_file).name
+            if error is None:
+                outputs.extend(files)
+                if incremental:
+                    source = Path(dicom_file).relative_to(input_path).as_posix()
+                    manifest[source] = {
+                        **details,
+                        "size": stats[source].st_size,
+                        "mtime_ns": stats[source].st_mtime_ns,
+                        "settings": settings,
+                        "outputs": [Path(f).relative_to(output_path).as_posix() for f in files],
+                    }
+                converted = Path(files[0]).name if len(files) == 1 else f"{len(files)} files"
+                print(f"[{done}/{len(tasks)}] Converted: {name} -> {converted}")
+            else:
+                failures.append((dicom_file, error))
+                print(f"[{done}/{len(tasks)}] Error converting {name}: {error}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        # Saved even after an interruption so finished files are not redone
+        if incremental:
+            save_conversion_manifest(output_path, manifest)
+
+    if failures:
+        print(f"\n{len(failures)} of {len(tasks)} files failed:")
+        for dicom_file, error in failures:
+            print(f"  {dicom_file}: {error}")
 
     return outputs
 
 
+# Header index: column -> DICOM keyword. Only these elements are parsed.
+INDEX_TAGS = {
+    "sop_instance_uid": "SOPInstanceUID",
+    "study_instance_uid": "StudyInstanceUID",
+    "series_instance_uid": "SeriesInstanceUID",
+    "patient_id": "PatientID",
+    "study_date": "StudyDate",
+    "modality": "Modality",
+    "body_part": "BodyPartExamined",
+    "view_position": "ViewPosition",
+    "photometric_interpretation": "PhotometricInterpretation",
+    "height": "Rows",
+    "width": "Columns",
+    "bits_stored": "BitsStored",
+    "number_of_frames": "NumberOfFrames",
+    "window_center": "WindowCenter",
+    "window_width": "WindowWidth",
+}
+INDEX_INTEGER_COLUMNS = {"height", "width", "bits_stored", "number_of_frames"}
+INDEX_COLUMNS = ["path", "size", "mtime_ns", "transfer_syntax", *INDEX_TAGS]
+INDEXED_COLUMNS = ["sop_instance_uid", "modality", "view_position", "photometric_interpretation", "study_date"]
+
+
+def read_header(path: str) -> dict:
+    """Read the INDEX_TAGS elements of one DICOM file without touching the pixel data."""
+    st = os.stat(path)
+    ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=list(INDEX_TAGS.values()))
+    row = {
+        "path": str(Path(path).resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "transfer_syntax": str(ds.file_meta.get("TransferSyntaxUID", "")) or None,
+    }
+    for column, keyword in INDEX_TAGS.items():
+        value = ds.get(keyword)
+        if isinstance(value, pydicom.multival.MultiValue):
+            value = value[0] if len(value) else None
+        if value is None or value == "":
+            row[column] = None
+        elif column in INDEX_INTEGER_COLUMNS:
+            row[column] = int(value)
+        else:
+            row[column] = str(value)
+    return row
+
+
+def _index_task(path: str) -> tuple:
+    """Read one header for the index; returns (row or None, error message or None)."""
+    try:
+        return read_header(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def open_index(index_path: str) -> sqlite3.Connection:
+    """Open (creating if needed) a header index database."""
+    conn = sqlite3.connect(index_path)
+    column_defs = ", ".join(
+        f"{c} INTEGER" if c in INDEX_INTEGER_COLUMNS or c in ("size", "mtime_ns") else f"{c} TEXT"
+        for c in INDEX_COLUMNS[1:]
+    )
+    conn.execute(f"CREATE TABLE IF NOT EXISTS dicom_index (path TEXT PRIMARY KEY, {column_defs})")
+    for column in INDEXED_COLUMNS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{column} ON dicom_index ({column})")
+    return conn
+
+
+def build_index(input_dir: str, index_path: str, workers: int = 1, chunksize: int = None) -> dict:
+    """
+    Index the headers of every DICOM file under a directory into SQLite.
+
+    Headers are read with stop_before_pixels and specific_tags, so pixel data
+    is never read or decoded. Files already indexed with the same size and
+    mtime are skipped, and rows for files that are gone are removed, so
+    re-indexing a large archive only reads what changed.
+
+    Args:
+        input_dir: Directory to index (searched recursively)
+        index_path: SQLite database to create or update
+        workers: Number of worker processes reading headers
+        chunksize: Files handed to a worker at a time (default: sized from the file count)
+
+    Returns:
+        Counts of indexed, unchanged, removed and failed files
+    """
+    conn = open_index(index_path)
+    known = {path: (size, mtime) for path, size, mtime in conn.execute("SELECT path, size, mtime_ns FROM dicom_index")}
+
+    paths, seen = [], set()
+    for dicom_file in find_dicom_files(input_dir):
+        path = str(dicom_file.resolve())
+        seen.add(path)
+        st = dicom_file.stat()
+        if known.get(path) != (st.st_size, st.st_mtime_ns):
+            paths.append(path)
+
+    root = str(Path(input_dir).resolve())
+    removed = [p for p in known if p not in seen and (p + os.sep).startswith(root + os.sep)]
+    conn.executemany("DELETE FROM dicom_index WHERE path = ?", [(p,) for p in removed])
+
+    if workers > 1 and len(paths) > 1:
+        if chunksize is None:
+            chunksize = max(1, min(256, len(paths) // (workers * 4)))
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_index_task, paths, chunksize=chunksize)
+    else:
+        pool = None
+        results = map(_index_task, paths)
+
+    insert = (f"INSERT OR REPLACE INTO dicom_index ({', '.join(INDEX_COLUMNS)}) "
+              f"VALUES ({', '.join('?' for _ in INDEX_COLUMNS)})")
+    failures = []
+    rows = []
+    try:
+        for done, (path, (row, error)) in enumerate(zip(paths, results), 1):
+            if error is not None:
+                failures.append((path, error))
+                continue
+            rows.append([row[c] for c in INDEX_COLUMNS])
+            if len(rows) >= 1000:
+                conn.executemany(insert, rows)
+                conn.commit()
+                rows = []
+                print(f"Indexed {done}/{len(paths)}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        conn.executemany(insert, rows)
+        conn.commit()
+        conn.close()
+
+    if failures:
+        print(f"\n{len(failures)} of {len(paths)} files failed:")
+        for path, error in failures:
+            print(f"  {path}: {error}")
+
+    return {
+        "indexed": len(paths) - len(failures),
+        "unchanged": len(seen) - len(paths),
+        "removed": len(removed),
+        "failed": len(failures),
+    }
+
+
+def select_from_index(
+    index_path: str,
+    modality: list = None,
+    view_position: list = None,
+    photometric_interpretation: list = None,
+    min_width: int = None,
+    min_height: int = None,
+    where: str = None,
+) -> list:
+    """
+    Paths of indexed files matching every given filter.
+
+    List filters match any of their values (case-insensitive); `where` is an
+    extra SQL condition over the dicom_index columns (see INDEX_COLUMNS).
+    """
+    conditions, params = [], []
+    for column, values in (("modality", modality), ("view_position", view_position),
+                           ("photometric_interpretation", photometric_interpretation)):
+        if values:
+            conditions.append(f"UPPER({column}) IN ({', '.join('?' for _ in values)})")
+            params.extend(v.upper() for v in values)
+    if min_width is not None:
+        conditions.append("width >= ?")
+        params.append(min_width)
+    if min_height is not None:
+        conditions.append("height >= ?")
+        params.append(min_height)
+    if where:
+        conditions.append(f"({where})")
+
+    query = "SELECT path FROM dicom_index"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    conn = sqlite3.connect(index_path)
+    try:
+        return [path for (path,) in conn.execute(query + " ORDER BY path", params)]
+    finally:
+        conn.close()
+
+
+def index_main(argv: list) -> None:
+    """The `index` and `select` subcommands."""
+    parser = argparse.ArgumentParser(
+        prog="dicom_to_png.py",
+        description="Index DICOM headers into SQLite and select files from the index"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Index the headers of a DICOM directory tree")
+    index.add_argument("input", help="Directory of DICOM files")
+    index.add_argument("index", help="SQLite index file to create or update")
+    index.add_argument("--workers", type=int, default=1, help="Worker processes reading headers (default: 1)")
+
+    select = commands.add_parser("select", help="Print paths of indexed files matching filters")
+    select.add_argument("index", help="SQLite index file")
+    select.add_argument("--modality", nargs="+", help="e.g. CR DX")
+    select.add_argument("--view", nargs="+", help="View position, e.g. PA AP")
+    select.add_argument("--photometric", nargs="+", help="e.g. MONOCHROME2")
+    select.add_argument("--min-width", type=int, help="Minimum Columns")
+    select.add_argument("--min-height", type=int, help="Minimum Rows")
+    select.add_argument("--where", help=f"Extra SQL condition over: {', '.join(INDEX_COLUMNS)}")
+    select.add_argument("--count", action="store_true", help="Print the number of matches only")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        counts = build_index(args.input, args.index, workers=args.workers)
+        print(f"\nIndexed {counts['indexed']} files ({counts['unchanged']} unchanged, "
+              f"{counts['removed']} removed, {counts['failed']} failed)")
+        return
+
+    paths = select_from_index(args.index, args.modality, args.view, args.photometric,
+                              args.min_width, args.min_height, args.where)
+    if args.count:
+        print(len(paths))
+    else:
+        for path in paths:
+            print(path)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("index", "select"):
+        index_main(sys.argv[1:])
+        return
+
     parser = argparse.ArgumentParser(
-        description="Convert DICOM files to PNG for chest X-ray analysis"
+        description="Convert DICOM files to PNG for chest X-ray analysis",
+        epilog="Subcommands: `index` and `select` build and query a header index (see module docstring)."
     )
     parser.add_argument("input", help="Input DICOM file or directory")
     parser.add_argument("output", help="Output PNG file or directory")
     parser.add_argument(
         "--window",
         choices=list(WINDOW_PRESETS.keys()),
-        default="auto",
-        help="Window preset (default: auto)"
+        nargs="+",
+        default=["auto"],
+        help="Window preset(s); several are exported from one decode (default: auto)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(OUTPUT_FORMATS.keys()),
+        help="Output format (default: from the output file extension, else png)"
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=6,
+        help="PNG zlib compression level 0-9 (default: 6; 1 encodes much faster for slightly larger files)"
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=90,
+        help="JPEG/WebP quality (default: 90)"
+    )
+    parser.add_argument(
+        "--max-edge",
+        type=int,
+        help="Downscale so the longest side is at most this many pixels"
     )
     parser.add_argument(
         "--batch",
         action="store_true",
         help="Batch convert directory of DICOMs"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"Worker processes for --batch (default: 1, this machine has {os.cpu_count()} CPUs)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"With --batch, only convert new or changed files (tracked in OUTPUT/{CONVERSION_MANIFEST})"
+    )
 
     args = parser.parse_args()
 
+    output_format = args.format
+    if output_format is None:
+        suffix = Path(args.output).suffix.lower()
+        output_format = {".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}.get(suffix, "png")
+        if args.batch:
+            output_format = "png"
+    encoder = ImageEncoder(output_format, args.compress_level, args.quality, args.max_edge)
+
     if args.batch:
-        outputs = batch_convert(args.input, args.output, args.window)
+        outputs = batch_convert(args.input, args.output, args.window, workers=args.workers,
+                                incremental=args.incremental, encoder=encoder)
         print(f"\nConverted {len(outputs)} files")
     else:
-        output = convert_dicom_to_png(args.input, args.output, args.window)
-        print(f"Saved: {output}")
+        output = Path(args.output)
+        # Keep the suffix the user gave, so one view is written to exactly args.output
+        for saved in export_dicom(args.input, str(output.parent), output.stem, args.window, encoder,
+                                  output.suffix or None):
+            print(f"Saved: {saved}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""
+Tests for the benchmark's shared rate limiter and retry/backoff path.
+
+A fake client raises rate-limit (429) and overload (529) errors before
+succeeding, and a fake clock stands in for `time`, so no test sleeps.
+
+Run with: python -m pytest tests/
+"""
+
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import anthropic
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmark"))
+
+import run_benchmark
+from run_benchmark import ResultJournal, TokenBucket, call_with_backoff, run_batch_jobs, stream_message
+
+# The HTTP library the SDK is built on (httpx, or httpx2 in newer releases)
+http = sys.modules[run_benchmark.TRANSPORT_ERRORS[0].__module__]
+
+
+class FakeClock:
+    """Stands in for the `time` module: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeClient:
+    """Raises the queued errors one call at a time, then returns "ok"."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __call__(self):
+        self.calls.append(run_benchmark.time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def status_error(status: int, retry_after: str = None) -> anthropic.APIStatusError:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    request = http.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = http.Response(status, headers=headers, request=request)
+    return anthropic.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(run_benchmark, "time", clock)
+    return clock
+
+
+def test_retries_until_success_honouring_retry_after(clock):
+    client = FakeClient([status_error(429, "3"), status_error(529, "5")])
+    stats = {}
+    assert call_with_backoff(client, stats=stats) == "ok"
+    assert len(client.calls) == 3
+    assert stats["retries"] == 2
+    assert clock.sleeps == [3.0, 5.0]
+
+
+def test_throttle_pauses_the_shared_limiter(clock):
+    limiter = TokenBucket(rate=None)
+    client = FakeClient([status_error(429, "4")])
+    assert call_with_backoff(client, limiter) == "ok"
+    # The retry waited out the pause in acquire(), not in a private sleep
+    assert client.calls[1] - client.calls[0] == pytest.approx(4.0)
+    # ...and so does any other worker sharing the limiter
+    start = clock.now
+    limiter.throttle(2.0)
+    limiter.acquire()
+    assert clock.now - start == pytest.approx(2.0)
+
+
+def test_throttle_halves_the_rate_and_recovers(clock):
+    limiter = TokenBucket(rate=10.0)
+    client = FakeClient([status_error(529, "1"), status_error(429, "1")])
+    call_with_backoff(client, limiter)
+    # Halved twice, then stepped back up once by the success
+    assert limiter.rate == pytest.approx(2.5 + 10.0 / 20)
+    for _ in range(200):
+        limiter.recover()
+    assert limiter.rate == 10.0
+
+
+def test_token_bucket_spaces_requests(clock):
+    limiter = TokenBucket(rate=4.0, burst=2)
+    start = clock.now
+    for _ in range(6):
+        limiter.acquire()
+    # Two burst tokens go at once; the other four wait 1/4 s each
+    assert clock.now - start == pytest.approx(1.0)
+
+
+def test_exponential_backoff_without_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(run_benchmark.random, "uniform", lambda low, high: high)
+    client = FakeClient([status_error(503), status_error(500), status_error(502)])
+    assert call_with_backoff(client) == "ok"
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+
+def test_gives_up_after_max_retries(clock):
+    client = FakeClient([status_error(429, "1")] * 5)
+    stats = {}
+    with pytest.raises(anthropic.APIStatusError) as raised:
+        call_with_backoff(client, max_retries=2, stats=stats)
+    assert raised.value.status_code == 429
+    assert len(client.calls) == 3
+    assert stats["retries"] == 2
+
+
+def test_client_errors_are_not_retried(clock):
+    client = FakeClient([status_error(400)])
+    with pytest.raises(anthropic.APIStatusError):
+        call_with_backoff(client)
+    assert len(client.calls) == 1
+    assert clock.sleeps == []
+
+
+def stream_events(*events) -> bytes:
+    return "".join(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events).encode()
+
+
+MESSAGE_START = {"type": "message_start", "message": {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "m", "content": [],
+    "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 1000, "output_tokens": 1}}}
+TEXT_START = {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+TEXT = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "**Pneumonia:** NO\n"}}
+MESSAGE_END = [
+    {"type": "content_block_stop", "index": 0},
+    {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 9}},
+    {"type": "message_stop"},
+]
+
+
+def streaming_client(responses) -> anthropic.Anthropic:
+    """A real SDK client whose transport replays `responses` (bytes, or an exception to raise)."""
+    responses = list(responses)
+
+    def handle(request):
+        body = responses.pop(0)
+        if isinstance(body, Exception):
+            raise body
+        return http.Response(200, headers={"content-type": "text/event-stream"}, content=body)
+
+    return anthropic.Anthropic(api_key="test", max_retries=0, http_client=http.Client(transport=http.MockTransport(handle)))
+
+
+@pytest.mark.parametrize("kind", ["overloaded_error", "rate_limit_error", "api_error"])
+def test_error_event_mid_stream_is_retried(clock, kind):
+    error = {"type": "error", "error": {"type": kind, "message": "try again"}}
+    client = streaming_client([
+        stream_events(MESSAGE_START, TEXT_START, TEXT, error),
+        stream_events(MESSAGE_START, TEXT_START, TEXT, *MESSAGE_END),
+    ])
+    limiter = TokenBucket(rate=10.0)
+    stats = {}
+    params = {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "x"}]}
+    message, _ = call_with_backoff(lambda: stream_message(client, params), limiter, stats=stats)
+    assert message.content[0].text == "**Pneumonia:** NO\n"
+    assert stats["retries"] == 1
+    # Overload and rate-limit events back off the whole pool like a 529/429
+    throttled = kind != "api_error"
+    assert limiter.rate == (pytest.approx(5.0 + 10.0 / 20) if throttled else 10.0)
+
+
+def test_invalid_request_event_mid_stream_is_not_retried(clock):
+    error = {"type": "error", "error": {"type": "invalid_request_error", "message": "no"}}
+    client = streaming_client([stream_events(MESSAGE_START, error)])
+    params = {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "x"}]}
+    with pytest.raises(anthropic.APIStatusError):
+        call_with_backoff(lambda: stream_message(client, params))
+
+
+def test_dropped_connection_is_retried(clock):
+    client = FakeClient([http.ReadError("peer closed connection"), http.RemoteProtocolError("incomplete chunked read")])
+    stats = {}
+    assert call_with_backoff(client, stats=stats) == "ok"
+    assert stats["retries"] == 2
+
+
+class FakeBatches:
+    """messages.batches for one finished batch whose results fetch fails with `errors` first."""
+
+    def __init__(self, entries, errors):
+        self.entries = entries
+        self.errors = list(errors)
+        self.fetches = 0
+
+    def retrieve(self, batch_id):
+        return SimpleNamespace(id=batch_id, processing_status="ended")
+
+    def results(self, batch_id):
+        self.fetches += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return iter(self.entries)
+
+
+def batch_entry(index: int, text: str):
+    usage = SimpleNamespace(input_tokens=1000, output_tokens=50)
+    message = SimpleNamespace(content=[SimpleNamespace(text=text)], usage=usage)
+    return SimpleNamespace(custom_id=f"job-{index}", result=SimpleNamespace(type="succeeded", message=message))
+
+
+def test_batch_results_fetch_is_retried(clock, tmp_path):
+    # A journaled batch is polled and collected without resubmitting anything
+    journal = ResultJournal(tmp_path / "run.jsonl")
+    journal.path.write_text(
+        json.dumps({"type": "run"}) + "\n" + json.dumps({"type": "batch", "id": "msgbatch_1", "indices": [0]}) + "\n"
+    )
+    journal.load()
+    journal.start()
+    batches = FakeBatches(
+        [batch_entry(0, "**Pneumonia:** YES\n**Confidence:** 4 (80%)\n")],
+        [status_error(503), status_error(429, "2")],
+    )
+    client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+    jobs = {0: ("chest_xray/test/PNEUMONIA/a.jpeg", "YES", {"model": "m", "prompt": "p"})}
+
+    results = list(run_batch_jobs(client, jobs, journal=journal, poll_interval=0))
+    journal.close()
+    assert batches.fetches == 3
+    assert [(i, result["prediction"]) for i, (result, _) in results] == [(0, "YES")]